@@ -9,12 +9,22 @@ import os
 import sys
 import json
 import argparse
+import fnmatch
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 import re
 
 
+# Patterns (.gitignore syntax) always excluded from the repository scan
+DEFAULT_EXCLUDE_PATTERNS = [
+    '.git/', 'venv/', '__pycache__/', '.ipynb_checkpoints/', 'node_modules/'
+]
+
+# Maximum number of file names listed per directory in the structure tree
+DEFAULT_MAX_FILES_PER_DIR = 50
+
+
 @dataclass
 class AgentConfig:
     """Agent configuration parsed from markdown file.
@@ -29,8 +39,9 @@ class AgentConfig:
         Model to use (e.g., 'opus', 'sonnet').
     tools : List[str]
         List of tools available to the agent.
-    content : str
-        Full content of the agent definition.
+    content : Optional[str]
+        Full content of the agent definition, or None until loaded with
+        ``read_content`` (discovery only reads the frontmatter).
     file_path : str
         Path to the agent definition file.
     """
@@ -38,28 +49,143 @@ class AgentConfig:
     description: str
     model: str
     tools: List[str]
-    content: str
+    content: Optional[str]
     file_path: str
+    
+    def read_content(self) -> str:
+        """Load (once) and return the full agent definition."""
+        if self.content is None:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                self.content = f.read()
+        return self.content
+
+
+@dataclass
+class IgnoreRule:
+    """Single ignore pattern in .gitignore syntax.
+    
+    Attributes
+    ----------
+    pattern : str
+        Glob pattern without negation, anchoring or trailing slash.
+    base : str
+        Directory (relative to repo root, '' for root) the rule applies under.
+    negate : bool
+        Pattern started with '!' (re-includes matching paths).
+    dir_only : bool
+        Pattern ended with '/' (matches directories only).
+    anchored : bool
+        Pattern contained a '/' (matched against the path relative to
+        ``base`` instead of the file name).
+    """
+    pattern: str
+    base: str
+    negate: bool
+    dir_only: bool
+    anchored: bool
+    
+    @classmethod
+    def parse(cls, line: str, base: str = '') -> Optional['IgnoreRule']:
+        """Parse one .gitignore line. Returns None for blanks and comments."""
+        line = line.rstrip('\n').rstrip()
+        if not line or line.startswith('#'):
+            return None
+        
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        if line.startswith('\\'):
+            line = line[1:]
+        
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        anchored = '/' in line
+        line = line.lstrip('/')
+        if not line:
+            return None
+        
+        return cls(line, base, negate, dir_only, anchored)
+    
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        """Check whether a '/'-separated path relative to repo root matches."""
+        if self.dir_only and not is_dir:
+            return False
+        
+        if self.base:
+            if not rel_path.startswith(self.base + '/'):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        
+        if not self.anchored:
+            return fnmatch.fnmatchcase(rel_path.rsplit('/', 1)[-1], self.pattern)
+        
+        return _match_segments(self.pattern.split('/'), rel_path.split('/'))
+
+
+def _match_segments(pattern: List[str], parts: List[str]) -> bool:
+    """Match path segments one by one, as git does for anchored patterns.
+    
+    Wildcards never cross a '/'. A '**' segment matches zero or more
+    segments, except a trailing '**', which needs at least one.
+    """
+    if not pattern:
+        return not parts
+    if pattern[0] == '**':
+        if len(pattern) == 1:
+            return bool(parts)
+        return any(_match_segments(pattern[1:], parts[i:]) for i in range(len(parts) + 1))
+    return (bool(parts) and fnmatch.fnmatchcase(parts[0], pattern[0])
+            and _match_segments(pattern[1:], parts[1:]))
+
+
+def is_ignored(rel_path: str, is_dir: bool, rules: List[IgnoreRule]) -> bool:
+    """Apply ignore rules in order; the last matching rule wins."""
+    ignored = False
+    for rule in rules:
+        if rule.matches(rel_path, is_dir):
+            ignored = not rule.negate
+    return ignored
 
 
 class AgentCLI:
     """Command line interface for repository agents."""
     
-    def __init__(self, repo_root: str = None):
+    def __init__(
+        self,
+        repo_root: str = None,
+        exclude_patterns: Optional[List[str]] = None,
+        max_files_per_dir: int = DEFAULT_MAX_FILES_PER_DIR
+    ):
         """Initialize AgentCLI.
         
         Parameters
         ----------
         repo_root : str, optional
             Repository root path. If None, uses current directory.
+        exclude_patterns : List[str], optional
+            Extra patterns (.gitignore syntax) excluded from the repository
+            scan, on top of ``DEFAULT_EXCLUDE_PATTERNS`` and .gitignore files.
+        max_files_per_dir : int, optional
+            Maximum number of file names listed per directory in the
+            structure tree (default: DEFAULT_MAX_FILES_PER_DIR).
         """
         self.repo_root = Path(repo_root) if repo_root else Path.cwd()
         self.context_dir = self.repo_root / "context"
         self.context_file = self.context_dir / "repo_context.json"
+        self.agents_cache_file = self.context_dir / "agents_cache.json"
+        self.exclude_patterns = DEFAULT_EXCLUDE_PATTERNS + list(exclude_patterns or [])
+        self.max_files_per_dir = max_files_per_dir
+        self._agents_cache: Optional[Dict[str, Any]] = None
+        self._agents_cache_dirty = False
+        self._agents: Optional[Dict[str, AgentConfig]] = None
         
     def parse_agent_file(self, file_path: Path) -> Optional[AgentConfig]:
         """Parse agent configuration from markdown file.
         
+        Only the frontmatter is read: scanning stops at the closing
+        ``---``. The full document is loaded on demand by
+        ``AgentConfig.read_content``.
+        
         Parameters
         ----------
         file_path : Path
@@ -71,18 +197,29 @@ class AgentCLI:
             Parsed agent configuration or None if parsing fails.
         """
         try:
+            frontmatter_lines = None
             with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Extract frontmatter between --- delimiters (must be at start of file)
-            # Only match if --- is at the very beginning (after optional whitespace)
-            frontmatter_match = re.match(r'^\s*---\s*\n(.*?)\n---', content, re.MULTILINE | re.DOTALL)
+                # Frontmatter must be at the very beginning (after optional whitespace)
+                for line in f:
+                    if frontmatter_lines is None:
+                        if not line.strip():
+                            continue
+                        if line.strip() != '---':
+                            break
+                        frontmatter_lines = []
+                    elif line.startswith('---'):
+                        break
+                    else:
+                        frontmatter_lines.append(line)
+                else:
+                    # No closing delimiter
+                    frontmatter_lines = None
             
-            if not frontmatter_match:
+            if not frontmatter_lines:
                 print(f"[AGENT_CLI] Warning: No frontmatter found in {file_path}")
                 return None
             
-            frontmatter = frontmatter_match.group(1)
+            frontmatter = ''.join(frontmatter_lines)
             
             # Parse frontmatter fields
             name_match = re.search(r'name:\s*(.+)', frontmatter)
@@ -104,7 +241,7 @@ class AgentCLI:
                 description=desc_match.group(1).strip(),
                 model=model_match.group(1).strip(),
                 tools=tools,
-                content=content,
+                content=None,
                 file_path=str(file_path)
             )
             
@@ -112,14 +249,92 @@ class AgentCLI:
             print(f"[AGENT_CLI] Error parsing {file_path}: {e}")
             return None
     
+    def load_agent(self, file_path: Path) -> Optional[AgentConfig]:
+        """Parse an agent file through the persistent agents cache.
+        
+        Entries in ``context/agents_cache.json`` are keyed by path and
+        validated by mtime and size; an unchanged file is never re-read.
+        Files without a valid definition are cached too.
+        
+        Parameters
+        ----------
+        file_path : Path
+            Path to agent markdown file.
+        
+        Returns
+        -------
+        Optional[AgentConfig]
+            Parsed agent configuration or None if parsing fails.
+        """
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return None
+        
+        entries = self._load_agents_cache()
+        key = os.path.relpath(file_path, self.repo_root)
+        entry = entries.get(key)
+        
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            config = entry["config"]
+            if config is None:
+                return None
+            return AgentConfig(content=None, file_path=str(file_path), **config)
+        
+        agent_config = self.parse_agent_file(file_path)
+        entries[key] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "config": None if agent_config is None else {
+                "name": agent_config.name,
+                "description": agent_config.description,
+                "model": agent_config.model,
+                "tools": agent_config.tools
+            }
+        }
+        self._agents_cache_dirty = True
+        
+        return agent_config
+    
+    def _load_agents_cache(self) -> Dict[str, Any]:
+        """Load cached agent entries from disk (once per instance)."""
+        if self._agents_cache is None:
+            self._agents_cache = {}
+            try:
+                with open(self.agents_cache_file, 'r', encoding='utf-8') as f:
+                    self._agents_cache = json.load(f).get("entries", {})
+            except (OSError, ValueError, AttributeError):
+                pass
+        return self._agents_cache
+    
+    def _save_agents_cache(self) -> None:
+        """Persist the agents cache if it changed."""
+        if not self._agents_cache_dirty:
+            return
+        
+        try:
+            self.context_dir.mkdir(exist_ok=True)
+            with open(self.agents_cache_file, 'w', encoding='utf-8') as f:
+                json.dump({"entries": self._agents_cache}, f, indent=2, ensure_ascii=False)
+            self._agents_cache_dirty = False
+        except OSError as e:
+            print(f"[AGENT_CLI] Warning: Could not write {self.agents_cache_file}: {e}")
+    
     def discover_agents(self) -> Dict[str, AgentConfig]:
         """Discover all agent definitions in repository root.
         
+        Results are memoized for the lifetime of the instance and agent
+        files are parsed through ``load_agent``, so ``cmd_list``,
+        ``cmd_agent`` and ``generate_repo_context`` share the same cache.
+        
         Returns
         -------
         Dict[str, AgentConfig]
             Dictionary mapping agent names to their configurations.
         """
+        if self._agents is not None:
+            return self._agents
+        
         agents = {}
         
         # Search for agent files in docs/agents/ directory
@@ -129,7 +344,7 @@ class AgentCLI:
                 if md_file.name.upper() in ["README.MD"]:
                     continue
                 
-                agent_config = self.parse_agent_file(md_file)
+                agent_config = self.load_agent(md_file)
                 if agent_config:
                     # Use filename without extension as key (e.g., ARCHITECT.md -> architect)
                     agent_key = md_file.stem.lower()
@@ -140,17 +355,30 @@ class AgentCLI:
             if md_file.name.upper() in ["README.MD", "QUICKSTART.MD", "AGENTS.MD"]:
                 continue
             
-            agent_config = self.parse_agent_file(md_file)
+            agent_config = self.load_agent(md_file)
             if agent_config:
                 agent_key = md_file.stem.lower()
                 if agent_key not in agents:  # Don't override docs/agents/ files
                     agents[agent_key] = agent_config
-                
+        
+        self._save_agents_cache()
+        self._agents = agents
+        
         return agents
     
-    def generate_repo_context(self) -> Dict[str, Any]:
+    def generate_repo_context(
+        self,
+        previous: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """Generate repository context information.
         
+        Parameters
+        ----------
+        previous : Dict[str, Any], optional
+            Previously generated context. Directories whose mtime has not
+            changed since then are taken from it instead of being listed
+            again. If None, the whole tree is scanned.
+        
         Returns
         -------
         Dict[str, Any]
@@ -178,78 +406,178 @@ class AgentCLI:
                 "file": agent_config.file_path
             }
         
-        # Scan repository structure (excluding venv, .git, etc.)
-        exclude_dirs = {'.git', 'venv', '__pycache__', '.ipynb_checkpoints', 'node_modules'}
+        # Scan repository structure and metadata in a single pass
+        structure, metadata, scan = self._scan_repository(previous)
         
-        for root, dirs, files in os.walk(self.repo_root):
-            # Filter out excluded directories
-            dirs[:] = [d for d in dirs if d not in exclude_dirs]
-            
-            rel_path = os.path.relpath(root, self.repo_root)
-            if rel_path == '.':
-                rel_path = 'root'
-            
-            # Track key directories
-            if rel_path not in ['root'] and not rel_path.startswith('.'):
-                context["metadata"]["key_directories"].append(rel_path)
-            
-            # Track Python files and notebooks
-            for file in files:
-                file_path = os.path.join(rel_path, file)
-                if file.endswith('.py'):
-                    context["metadata"]["python_files"].append(file_path)
-                elif file.endswith('.ipynb'):
-                    context["metadata"]["notebooks"].append(file_path)
+        # .gitignore files changed: cached listings may use stale rules
+        if previous is not None and scan["gitignores"] != previous.get("scan", {}).get("gitignores"):
+            structure, metadata, scan = self._scan_repository(None)
         
-        # Build structure tree
-        context["structure"] = self._build_tree_structure()
+        context["structure"] = structure
+        context["metadata"] = metadata
+        context["scan"] = scan
         
         return context
     
-    def _build_tree_structure(self) -> Dict[str, Any]:
-        """Build directory tree structure.
+    def _scan_repository(
+        self,
+        previous: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, List[str]], Dict[str, Any]]:
+        """Walk the repository once, building tree structure and metadata.
+        
+        Honours ``exclude_patterns`` and every .gitignore found on the way
+        (ignored directories are not entered). Each directory's mtime is
+        recorded; when ``previous`` was generated with the same settings, a
+        directory whose mtime is unchanged reuses its previous listing
+        instead of being listed again.
+        
+        Parameters
+        ----------
+        previous : Dict[str, Any], optional
+            Previously generated context to refresh incrementally.
         
         Returns
         -------
-        Dict[str, Any]
-            Tree structure of the repository.
+        Tuple[Dict[str, Any], Dict[str, List[str]], Dict[str, Any]]
+            Structure tree, metadata and scan bookkeeping (settings,
+            directory mtimes and .gitignore mtimes).
         """
-        tree = {}
-        exclude_dirs = {'.git', 'venv', '__pycache__', '.ipynb_checkpoints', 'node_modules'}
+        settings = {
+            "exclude_patterns": self.exclude_patterns,
+            "max_files_per_dir": self.max_files_per_dir
+        }
         
-        for root, dirs, files in os.walk(self.repo_root):
-            dirs[:] = [d for d in dirs if d not in exclude_dirs]
+        prev_scan = (previous or {}).get("scan") or {}
+        reusable = prev_scan.get("settings") == settings
+        prev_dirs = prev_scan.get("dirs", {}) if reusable else {}
+        prev_gitignores = prev_scan.get("gitignores", {}) if reusable else {}
+        
+        # Previous Python files/notebooks grouped by directory
+        prev_listed = {}
+        if reusable:
+            for key in ("python_files", "notebooks"):
+                for file_path in previous.get("metadata", {}).get(key, []):
+                    prev_listed.setdefault((key, os.path.dirname(file_path)), []).append(file_path)
+        
+        structure = {}
+        metadata = {"python_files": [], "notebooks": [], "key_directories": []}
+        scan = {"settings": settings, "dirs": {}, "gitignores": {}, "rescanned": 0}
+        base_rules = [r for r in (IgnoreRule.parse(p) for p in self.exclude_patterns) if r]
+        
+        def load_gitignore(rel: str, path: Path, key: str) -> List[IgnoreRule]:
+            gitignore = path / '.gitignore'
+            try:
+                scan["gitignores"][key] = gitignore.stat().st_mtime_ns
+                with open(gitignore, 'r', encoding='utf-8') as f:
+                    rules = [IgnoreRule.parse(line, rel) for line in f]
+            except (OSError, UnicodeDecodeError):
+                return []
+            return [r for r in rules if r]
+        
+        def visit(rel: str, path: Path, rules: List[IgnoreRule],
+                  node: Dict[str, Any], prev_node: Optional[Dict[str, Any]]) -> None:
+            # Keys follow the historical format: 'root' for the top level
+            key = os.path.join(*rel.split('/')) if rel else 'root'
+            try:
+                mtime = path.stat().st_mtime_ns
+            except OSError:
+                return
             
-            rel_path = os.path.relpath(root, self.repo_root)
-            if rel_path == '.':
-                current = tree
+            cached = prev_dirs.get(key)
+            if cached is not None and cached[0] == mtime and prev_node is not None:
+                # Unchanged directory: reuse previous listing
+                if key in prev_gitignores:
+                    rules = rules + load_gitignore(rel, path, key)
+                subdirs = cached[1]
+                files = prev_node.get('_files', [])
+                omitted = prev_node.get('_files_omitted', 0)
+                python_files = prev_listed.get(("python_files", key), [])
+                notebooks = prev_listed.get(("notebooks", key), [])
             else:
-                parts = rel_path.split(os.sep)
-                current = tree
-                for part in parts:
-                    if part not in current:
-                        current[part] = {}
-                    current = current[part]
+                scan["rescanned"] += 1
+                try:
+                    entries = sorted(os.scandir(path), key=lambda e: e.name)
+                except OSError:
+                    return
+                
+                if any(e.name == '.gitignore' for e in entries):
+                    rules = rules + load_gitignore(rel, path, key)
+                
+                subdirs = []
+                file_names = []
+                for entry in entries:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    child_rel = f"{rel}/{entry.name}" if rel else entry.name
+                    if is_ignored(child_rel, is_dir, rules):
+                        continue
+                    (subdirs if is_dir else file_names).append(entry.name)
+                
+                python_files = [os.path.join(key, f) for f in file_names if f.endswith('.py')]
+                notebooks = [os.path.join(key, f) for f in file_names if f.endswith('.ipynb')]
+                visible = [f for f in file_names if not f.startswith('.')]
+                files = visible[:self.max_files_per_dir]
+                omitted = len(visible) - len(files)
+            
+            scan["dirs"][key] = [mtime, subdirs]
+            
+            # Track key directories
+            if rel and not rel.startswith('.'):
+                metadata["key_directories"].append(key)
+            
+            # Track Python files and notebooks
+            metadata["python_files"].extend(python_files)
+            metadata["notebooks"].extend(notebooks)
             
             # Add files to current level
             if files:
-                current['_files'] = [f for f in files if not f.startswith('.')]
-        
-        return tree
+                node['_files'] = files
+            if omitted:
+                node['_files_omitted'] = omitted
+            
+            for name in subdirs:
+                child = node.setdefault(name, {})
+                visit(
+                    f"{rel}/{name}" if rel else name,
+                    path / name,
+                    rules,
+                    child,
+                    prev_node.get(name) if prev_node is not None else None
+                )
+        
+        visit('', self.repo_root, base_rules, structure,
+              (previous or {}).get("structure") if reusable else None)
+        
+        return structure, metadata, scan
     
-    def cmd_init(self) -> None:
+    def cmd_init(self, full: bool = False) -> None:
         """Initialize repository context.
         
         Creates context directory and generates repo_context.json file
-        with repository structure and agent information.
+        with repository structure and agent information. An existing
+        repo_context.json is refreshed incrementally: only directories
+        modified since it was written are listed again.
+        
+        Parameters
+        ----------
+        full : bool, optional
+            Ignore the existing context and rescan the whole tree.
         """
         print("[AGENT_CLI] Initializing repository context...")
         
         # Create context directory if it doesn't exist
         self.context_dir.mkdir(exist_ok=True)
         
+        # Load previous context for incremental refresh
+        previous = None
+        if not full and self.context_file.exists():
+            try:
+                with open(self.context_file, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                previous = None
+        
         # Generate context
-        context = self.generate_repo_context()
+        context = self.generate_repo_context(previous)
         
         # Save to JSON file
         with open(self.context_file, 'w', encoding='utf-8') as f:
@@ -263,6 +591,8 @@ class AgentCLI:
         
         print(f"[AGENT_CLI] ✓ Tracked {len(context['metadata']['python_files'])} Python file(s)")
         print(f"[AGENT_CLI] ✓ Tracked {len(context['metadata']['notebooks'])} notebook(s)")
+        print(f"[AGENT_CLI] ✓ Rescanned {context['scan']['rescanned']} of "
+              f"{len(context['scan']['dirs'])} director(ies)")
         
     def cmd_agent(self, agent_name: str) -> None:
         """Execute agent-specific task.
@@ -303,13 +633,14 @@ class AgentCLI:
         print(f"[AGENT_CLI] Tools: {', '.join(agent_info['tools'])}")
         print()
         
-        # Load full agent configuration
-        agent_config = self.parse_agent_file(Path(agent_info['file']))
+        # Load full agent configuration (cached frontmatter, content on demand)
+        agent_config = self.load_agent(Path(agent_info['file']))
+        self._save_agents_cache()
         
         if agent_config:
             print("[AGENT_CLI] Agent Configuration:")
             print("=" * 60)
-            print(agent_config.content)
+            print(agent_config.read_content())
             print("=" * 60)
             print()
             print("[AGENT_CLI] Agent ready to execute tasks based on the above configuration.")
@@ -346,7 +677,13 @@ def main():
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
     
     # /init command
-    subparsers.add_parser('init', help='Initialize repository context')
+    init_parser = subparsers.add_parser('init', help='Initialize repository context')
+    init_parser.add_argument('--full', action='store_true',
+                             help='Rescan the whole tree instead of refreshing incrementally')
+    init_parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                             help='Extra exclude pattern (.gitignore syntax), repeatable')
+    init_parser.add_argument('--max-files', type=int, default=DEFAULT_MAX_FILES_PER_DIR,
+                             help='Maximum file names listed per directory')
     
     # /agent command
     agent_parser = subparsers.add_parser('agent', help='Execute agent task')
@@ -362,10 +699,13 @@ def main():
         return
     
     try:
-        cli = AgentCLI()
+        if args.command == 'init':
+            cli = AgentCLI(exclude_patterns=args.exclude, max_files_per_dir=args.max_files)
+        else:
+            cli = AgentCLI()
         
         if args.command == 'init':
-            cli.cmd_init()
+            cli.cmd_init(full=args.full)
         elif args.command == 'agent':
             cli.cmd_agent(args.name)
         elif args.command == 'list':
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark de códecs de salida del parser.
+
+Codifica una vez las partidas de un directorio PGN y, para cada códec
+(PNG por defecto, PNG rápido, WebP sin pérdidas, npy y packed), mide la
+velocidad de codificación y decodificación, el tamaño medio por muestra y
+comprueba que la ida y vuelta sea exacta.
+
+Uso:
+    python labs/benchmark_codecs.py --start-move 5 --end-move 14
+    python labs/benchmark_codecs.py --start-move 5 --end-move 14 --encoding heatmap
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Permite ejecutarlo desde la raíz del repositorio o desde labs/
+sys.path.insert(0, str(Path(__file__).parent))
+
+from parse_games_to_images import (
+    COLOR_MODES,
+    ENCODINGS,
+    NpyCodec,
+    PackedCodec,
+    PngCodec,
+    RejectLog,
+    WebpCodec,
+    iter_encoded_games,
+)
+
+
+def benchmark_codecs(pgn_dir, start_move, end_move, compression_factor,
+                     encoding="overlay", color_mode="rgb", max_games=None,
+                     repeat=3):
+    """Mide cada códec sobre las mismas muestras.
+
+    Parameters
+    ----------
+    pgn_dir : Path
+        Directorio con archivos .pgn
+    start_move, end_move, compression_factor : int
+        Ventana y compresión, como en ``parse_games_to_images.main``
+    encoding : str, optional
+        "overlay" o "heatmap" (default: "overlay")
+    color_mode : str, optional
+        Modo de color de la superposición (default: "rgb")
+    max_games : int, optional
+        Límite de muestras; None usa todas (default: None)
+    repeat : int, optional
+        Repeticiones por códec; se toma el mejor tiempo (default: 3)
+
+    Returns
+    -------
+    list
+        Una fila por códec: ``(nombre, bytes/muestra, muestras/s al
+        codificar, muestras/s al decodificar, sin pérdidas)``.
+    """
+    samples = []
+    reject_log = RejectLog()
+    for pgn_path in sorted(Path(pgn_dir).glob("*.pgn")):
+        for _, _, array in iter_encoded_games(
+            pgn_path, start_move, end_move, compression_factor,
+            encoding=encoding, color_mode=color_mode, reject_log=reject_log
+        ):
+            samples.append(array)
+            if max_games is not None and len(samples) >= max_games:
+                break
+        if max_games is not None and len(samples) >= max_games:
+            break
+
+    if not samples:
+        raise ValueError(f"No hay partidas válidas en: {pgn_dir}")
+
+    raw_bytes = sum(array.nbytes for array in samples) / len(samples)
+    print(f"Muestras: {len(samples)} {samples[0].shape} {samples[0].dtype} "
+          f"({raw_bytes / 1024:.1f} KiB sin comprimir)")
+
+    codecs = [("npy", NpyCodec()), ("packed-zlib", PackedCodec("zlib"))]
+    try:
+        codecs.append(("packed-lz4", PackedCodec("lz4")))
+        codecs[-1][1].encode(samples[0])
+    except ImportError:
+        codecs.pop()
+        print("lz4 no instalado: se omite packed-lz4 (pip install lz4)")
+
+    if encoding == "overlay":
+        channels = 1 if color_mode in ("gray", "palette") else 3
+        codecs = [
+            ("png", PngCodec()),
+            ("png-fast", PngCodec(level=1, strategy="rle")),
+            ("webp", WebpCodec(channels=channels)),
+        ] + codecs
+
+    results = []
+    for name, codec in codecs:
+        encode_time = decode_time = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            encoded = [codec.encode(array) for array in samples]
+            encode_time = min(encode_time, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            decoded = [codec.decode(data) for data in encoded]
+            decode_time = min(decode_time, time.perf_counter() - start)
+
+        lossless = all(
+            a.shape == b.shape and a.dtype == b.dtype and np.array_equal(a, b)
+            for a, b in zip(samples, decoded)
+        )
+        size = sum(len(data) for data in encoded) / len(samples)
+        results.append((
+            name, size, len(samples) / encode_time, len(samples) / decode_time, lossless
+        ))
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de códecs de salida del parser")
+    parser.add_argument("--pgn-dir", type=Path,
+                        default=Path(__file__).parent / "dataset" / "testpgns")
+    parser.add_argument("--start-move", type=int, required=True)
+    parser.add_argument("--end-move", type=int, required=True)
+    parser.add_argument("--compression-factor", type=int, default=2)
+    parser.add_argument("--encoding", choices=ENCODINGS, default="overlay")
+    parser.add_argument("--color-mode", choices=COLOR_MODES, default="rgb")
+    parser.add_argument("--max-games", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = benchmark_codecs(
+        args.pgn_dir, args.start_move, args.end_move, args.compression_factor,
+        encoding=args.encoding, color_mode=args.color_mode,
+        max_games=args.max_games, repeat=args.repeat
+    )
+
+    print(f"\n{'códec':<12} {'KiB/muestra':>12} {'cod./s':>10} {'decod./s':>10}  sin pérdidas")
+    print("-" * 60)
+    for name, size, encode_rate, decode_rate, lossless in results:
+        print(f"{name:<12} {size / 1024:>12.2f} {encode_rate:>10.0f} {decode_rate:>10.0f}  "
+              f"{'✓' if lossless else '✗'}")
@@ -10,18 +10,136 @@ Basado en chess_cnn_visual_temporal.ipynb pero sin banda de metadatos.
 
 import chess
 import chess.pgn
+import chess.polyglot
 import chess.svg
 import numpy as np
 import cv2
-from typing import List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple, Optional, Union
 from pathlib import Path
-from io import StringIO
+from io import BytesIO, StringIO
+from functools import lru_cache
+from collections import Counter, deque
+from abc import ABC, abstractmethod
+import threading
+import hashlib
+import json
+import numbers
+import operator
+import os
+import re
+import shutil
+import struct
+import zlib
 import argparse
 import sys
 
 
-def board_to_png_array(board: chess.Board, size: int = 400) -> np.ndarray:
-    """Convierte un tablero de ajedrez a array numpy RGB desde SVG.
+# Codificaciones disponibles para cada partida
+ENCODINGS = ("overlay", "heatmap")
+
+# Modos de color de la superposición
+COLOR_MODES = ("rgb", "gray", "palette")
+
+# Número de entradas de la paleta en modo "palette"
+PALETTE_SIZE = 16
+
+# Techo de memoria por defecto para salidas pendientes de escribir (MB)
+DEFAULT_MAX_MEMORY_MB = 256
+
+# Backends de salida: un archivo por partida o almacén deduplicado por contenido
+OUTPUT_BACKENDS = ("files", "dedup")
+
+# Códecs de salida (ver make_codec)
+CODECS = ("png", "webp", "npy", "packed")
+
+# Motivos de descarte de partidas (ver RejectLog)
+REJECT_REASONS = (
+    "malformed_headers", "unknown_player", "too_short",
+    "illegal_move", "render_failure", "write_failure"
+)
+
+# Canales del mapa de calor de jugadas (orden del último eje)
+HEATMAP_CHANNELS = (
+    "from", "to", "capture",
+    "pawn", "knight", "bishop", "rook", "queen", "king"
+)
+
+
+def _gray_hex(color: str) -> str:
+    """Convierte un color SVG ``#rgb``/``#rrggbb[aa]`` a su gris equivalente.
+    
+    Usa la luminancia BT.601, la misma que ``cv2.COLOR_RGB2GRAY``. El canal
+    alfa, si existe, se conserva.
+    """
+    value = color.lstrip("#")
+    if len(value) in (3, 4):
+        value = "".join(c * 2 for c in value)
+    r, g, b = (int(value[k:k + 2], 16) for k in (0, 2, 4))
+    gray = int(round(0.299 * r + 0.587 * g + 0.114 * b))
+    return f"#{gray:02x}{gray:02x}{gray:02x}{value[6:]}"
+
+
+@lru_cache(maxsize=None)
+def svg_colors(color_mode: str = "rgb") -> Dict[str, str]:
+    """Colores de casillas y bordes para ``chess.svg.board`` según el modo.
+    
+    En los modos "gray" y "palette" la reducción de color se hace una sola
+    vez sobre los colores del SVG (las piezas ya son blanco/negro), de modo
+    que el tablero se renderiza directamente en gris y no hay que convertir
+    cada imagen.
+    
+    Parameters
+    ----------
+    color_mode : str, optional
+        Uno de ``COLOR_MODES`` (default: "rgb").
+    
+    Returns
+    -------
+    Dict[str, str]
+        Diccionario de colores para el parámetro ``colors`` (vacío en "rgb").
+    """
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"[CHESS_CNN] color_mode desconocido: {color_mode}")
+    
+    if color_mode == "rgb":
+        return {}
+    
+    return {key: _gray_hex(value) for key, value in chess.svg.DEFAULT_COLORS.items()}
+
+
+@lru_cache(maxsize=None)
+def palette_lut(palette_size: int = PALETTE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Tabla de cuantización gris → índice de paleta y la paleta asociada.
+    
+    Parameters
+    ----------
+    palette_size : int, optional
+        Número de entradas de la paleta, entre 2 y 256 (default: PALETTE_SIZE).
+    
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        ``(lut, palette)``: ``lut`` tiene shape (256,) uint8 y asigna a cada
+        nivel de gris su índice; ``palette`` tiene shape (palette_size, 3)
+        uint8 con el color RGB de cada índice.
+    """
+    if not 2 <= palette_size <= 256:
+        raise ValueError("[CHESS_CNN] palette_size debe estar entre 2 y 256")
+    
+    levels = np.round(np.linspace(0, 255, palette_size)).astype(np.uint8)
+    lut = np.round(np.arange(256) * (palette_size - 1) / 255).astype(np.uint8)
+    palette = np.repeat(levels[:, None], 3, axis=1)
+    
+    return lut, palette
+
+
+def board_to_png_array(
+    board: chess.Board,
+    size: int = 400,
+    color_mode: str = "rgb",
+    channel_order: str = "rgb"
+) -> np.ndarray:
+    """Convierte un tablero de ajedrez a array numpy desde SVG.
     
     Parameters
     ----------
@@ -29,180 +147,2335 @@ def board_to_png_array(board: chess.Board, size: int = 400) -> np.ndarray:
         Tablero de ajedrez en estado específico.
     size : int, optional
         Tamaño en pixels del tablero cuadrado (default: 400).
+    color_mode : str, optional
+        "rgb" (3 canales), "gray" (1 canal) o "palette" (índices de
+        ``palette_lut``) (default: "rgb").
+    channel_order : str, optional
+        Orden de canales en modo "rgb": "rgb" o "bgr" (nativo de OpenCV,
+        sin conversión) (default: "rgb").
     
     Returns
     -------
     np.ndarray
-        Array RGB de la imagen del tablero sin leyenda.
-        Shape: (size, size, 3), dtype: uint8
+        Array de la imagen del tablero sin leyenda.
+        Shape: (size, size, 3) en "rgb", (size, size) en "gray"/"palette";
+        dtype: uint8
     """
     if not isinstance(board, chess.Board):
         raise TypeError("[CHESS_CNN] board debe ser una instancia de chess.Board")
     
-    if size <= 0:
-        raise ValueError("[CHESS_CNN] size debe ser positivo")
+    if size <= 0:
+        raise ValueError("[CHESS_CNN] size debe ser positivo")
+    
+    if channel_order not in ("rgb", "bgr"):
+        raise ValueError(f"[CHESS_CNN] channel_order desconocido: {channel_order}")
+    
+    try:
+        import cairosvg
+    except ImportError:
+        raise ImportError(
+            "[CHESS_CNN] cairosvg no disponible. Instalar con: pip install cairosvg"
+        )
+    
+    # Generar SVG sin coordenadas para máxima limpieza visual
+    svg_data = chess.svg.board(
+        board=board,
+        size=size,
+        coordinates=False,
+        colors=svg_colors(color_mode)
+    )
+    
+    # Convertir SVG a PNG en memoria
+    png_data = cairosvg.svg2png(bytestring=svg_data.encode('utf-8'))
+    
+    # Decodificar PNG a array numpy
+    png_array = np.frombuffer(png_data, dtype=np.uint8)
+    
+    if color_mode != "rgb":
+        # El SVG ya es gris: decodificar directamente a un canal
+        img = cv2.imdecode(png_array, cv2.IMREAD_GRAYSCALE)
+        if color_mode == "palette":
+            img = palette_lut()[0][img]
+        return img
+    
+    img = cv2.imdecode(png_array, cv2.IMREAD_COLOR)
+    
+    if channel_order == "bgr":
+        return img
+    
+    # Convertir BGR (OpenCV) a RGB (estándar)
+    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    
+    return img_rgb
+
+
+def _normalize_player_name(name: str) -> str:
+    """Normaliza un nombre de jugador para comparación (minúsculas, solo letras)."""
+    return ''.join(c for c in name.lower() if c.isalpha())
+
+
+def resolve_player_color(
+    headers: Mapping[str, str],
+    player_name: str
+) -> Optional[chess.Color]:
+    """Determina con qué color jugó el jugador objetivo a partir de las cabeceras.
+    
+    Compara el apellido de las cabeceras ``White``/``Black`` (texto antes de la
+    coma) con el nombre del jugador, normalmente el nombre del archivo PGN
+    (``Izsak.pgn`` → ``Izsak``). Una coincidencia exacta tiene prioridad sobre
+    una coincidencia por prefijo (``Magem`` ↔ ``Magem Badals``,
+    ``Antunesl`` ↔ ``Antunes``).
+    
+    Parameters
+    ----------
+    headers : Mapping[str, str]
+        Cabeceras de la partida (``chess.pgn.Headers`` o diccionario).
+    player_name : str
+        Nombre del jugador objetivo.
+    
+    Returns
+    -------
+    Optional[chess.Color]
+        ``chess.WHITE`` o ``chess.BLACK``, o None si el jugador no aparece
+        en la partida o la coincidencia es ambigua.
+    """
+    target = _normalize_player_name(player_name)
+    if not target:
+        return None
+    
+    scores = {}
+    for color, key in ((chess.WHITE, "White"), (chess.BLACK, "Black")):
+        surname = _normalize_player_name(headers.get(key, "").split(",")[0])
+        if not surname:
+            scores[color] = 0
+        elif surname == target:
+            scores[color] = 2
+        elif surname.startswith(target) or target.startswith(surname):
+            scores[color] = 1
+        else:
+            scores[color] = 0
+    
+    if scores[chess.WHITE] == scores[chess.BLACK]:
+        return None
+    
+    return chess.WHITE if scores[chess.WHITE] > scores[chess.BLACK] else chess.BLACK
+
+
+def count_player_moves(
+    game: Union[chess.pgn.Game, "CorpusGame"],
+    player_color: Optional[chess.Color] = None
+) -> int:
+    """Cuenta las jugadas de la línea principal sin reproducirlas.
+    
+    Parameters
+    ----------
+    game : Union[chess.pgn.Game, CorpusGame]
+        Partida ya parseada, o leída de un ``MoveCorpus``.
+    player_color : Optional[chess.Color], optional
+        Si se indica, cuenta solo las jugadas de ese color (default: None).
+    
+    Returns
+    -------
+    int
+        Número de medias jugadas, o de jugadas del color indicado.
+    """
+    if isinstance(game, CorpusGame):
+        return _player_move_count(len(game.moves), game.board().turn, player_color)
+    
+    plies = game.end().ply() - game.ply()
+    return _player_move_count(plies, game.turn(), player_color)
+
+
+def _player_move_count(
+    plies: int,
+    first_mover: chess.Color,
+    player_color: Optional[chess.Color]
+) -> int:
+    """Jugadas de ``player_color`` en ``plies`` medias jugadas (todas si es None)."""
+    if player_color is None:
+        return plies
+    
+    # El primer color en mover recibe la jugada sobrante de un número impar
+    if first_mover == player_color:
+        return (plies + 1) // 2
+    return plies // 2
+
+
+def _short_game_error(
+    move_num: int,
+    start_move: int,
+    end_move: int,
+    player_color: Optional[chess.Color]
+) -> ValueError:
+    """Error de partida demasiado corta para la ventana solicitada."""
+    side = "" if player_color is None else " del jugador"
+    return ValueError(
+        f"[CHESS_CNN] La partida tiene solo {move_num} movimientos{side}, "
+        f"pero se solicitaron movimientos {start_move}-{end_move}"
+    )
+
+
+def iter_board_sequence(
+    game: Union[chess.pgn.Game, "CorpusGame"],
+    start_move: int,
+    end_move: int,
+    player_color: Optional[chess.Color] = None
+) -> Iterator[chess.Board]:
+    """Recorre las posiciones de la ventana sin copiar tableros.
+    
+    Generador equivalente a ``extract_board_sequence`` para procesamiento en
+    streaming: produce siempre el *mismo* objeto ``chess.Board``, avanzado a
+    la posición siguiente en cada iteración, de modo que la memoria es O(1)
+    en el tamaño de la ventana. El consumidor debe usar cada posición antes
+    de pedir la siguiente (o copiarla).
+    
+    Parameters
+    ----------
+    game : Union[chess.pgn.Game, CorpusGame]
+        Partida ya parseada, o leída de un ``MoveCorpus``.
+    start_move : int
+        Número del movimiento inicial (más antiguo).
+    end_move : int
+        Número del movimiento final (más reciente).
+    player_color : Optional[chess.Color], optional
+        Si se indica, solo se producen las posiciones tras las jugadas de
+        ese color (default: None).
+    
+    Yields
+    ------
+    chess.Board
+        Tablero tras cada movimiento de la ventana, del más antiguo al más
+        reciente.
+    """
+    if start_move < 1 or end_move < start_move:
+        raise ValueError(
+            f"[CHESS_CNN] Rango de movimientos inválido: {start_move}-{end_move}"
+        )
+    
+    board = game.board()
+    move_num = 0
+    
+    for move in game.mainline_moves():
+        mover = board.turn
+        board.push(move)
+        
+        # En modo por jugador, las jugadas del rival no cuentan
+        if player_color is not None and mover != player_color:
+            continue
+        
+        move_num += 1
+        
+        if move_num >= start_move:
+            yield board
+        
+        if move_num >= end_move:
+            return
+
+
+def extract_board_sequence(
+    pgn_text: Union[str, "CorpusGame"],
+    start_move: int,
+    end_move: int,
+    player_color: Optional[chess.Color] = None
+) -> List[chess.Board]:
+    """Extrae secuencia de tableros desde PGN entre movimientos especificados.
+    
+    Para ventanas anchas o partidas largas, ``iter_board_sequence`` evita
+    materializar una copia del tablero por posición.
+    
+    Parameters
+    ----------
+    pgn_text : Union[str, CorpusGame]
+        Texto completo del archivo PGN, o partida de un ``MoveCorpus`` (se
+        reproduce sin resolver SAN).
+    start_move : int
+        Número del movimiento inicial (más antiguo).
+    end_move : int
+        Número del movimiento final (más reciente).
+    player_color : Optional[chess.Color], optional
+        Si se indica, solo se conservan las posiciones tras las jugadas de
+        ese color y la ventana cuenta jugadas de ese jugador, no medias
+        jugadas (default: None, todas las medias jugadas).
+    
+    Returns
+    -------
+    List[chess.Board]
+        Lista de tableros ordenados del más antiguo al más reciente.
+        Posición 0 = movimiento start_move
+        Última posición = movimiento end_move
+    """
+    # Parsear PGN
+    game = _as_game(pgn_text)
+    
+    # Copiar tablero para evitar referencias mutables
+    boards = [
+        board.copy()
+        for board in iter_board_sequence(game, start_move, end_move, player_color)
+    ]
+    
+    if len(boards) < (end_move - start_move + 1):
+        raise _short_game_error(
+            count_player_moves(game, player_color), start_move, end_move, player_color
+        )
+    
+    return boards
+
+
+def overlay_temporal_sequence(
+    board_sequence: List[chess.Board],
+    compression_factor: int = 2,
+    board_size: int = 400,
+    min_intensity: float = 0.3,
+    max_intensity: float = 1.0,
+    color_mode: str = "rgb",
+    channel_order: str = "rgb"
+) -> np.ndarray:
+    """Superpone secuencia de tableros con intensidad temporal decreciente.
+    
+    Ver ``overlay_temporal_stream`` para la variante en streaming y
+    ``overlay_temporal_pyramid`` para varias resoluciones en una pasada.
+    
+    Los tableros se superponen con transparencia basada en antigüedad:
+    - Movimiento más reciente (última posición): intensidad máxima (brillante)
+    - Movimiento más antiguo (primera posición): intensidad mínima (oscuro)
+    
+    Parameters
+    ----------
+    board_sequence : List[chess.Board]
+        Secuencia de tableros ordenados del más antiguo al más reciente.
+    compression_factor : int, optional
+        Factor de reducción de tamaño (default: 2).
+        1 = sin compresión, 2 = mitad de tamaño, 4 = cuarto de tamaño, etc.
+    board_size : int, optional
+        Tamaño del tablero antes de compresión (default: 400).
+    min_intensity : float, optional
+        Intensidad mínima para movimientos antiguos (default: 0.3).
+    max_intensity : float, optional
+        Intensidad máxima para movimientos recientes (default: 1.0).
+    color_mode : str, optional
+        "rgb", "gray" o "palette". En "palette" se acumula en gris y el
+        resultado se cuantiza con ``palette_lut`` (default: "rgb").
+    channel_order : str, optional
+        Orden de canales en modo "rgb": "rgb" o "bgr" (listo para
+        ``cv2.imwrite`` sin conversión) (default: "rgb").
+    
+    Returns
+    -------
+    np.ndarray
+        Imagen con superposición temporal.
+        Shape: (height, width, 3) en "rgb", (height, width) en
+        "gray"/"palette"; dtype: uint8.
+    """
+    if not board_sequence:
+        raise ValueError("[CHESS_CNN] board_sequence no puede estar vacía")
+    
+    return overlay_temporal_stream(
+        board_sequence,
+        len(board_sequence),
+        compression_factor=compression_factor,
+        board_size=board_size,
+        min_intensity=min_intensity,
+        max_intensity=max_intensity,
+        color_mode=color_mode,
+        channel_order=channel_order
+    )
+
+
+def overlay_temporal_stream(
+    boards: Iterable[chess.Board],
+    num_boards: int,
+    compression_factor: int = 2,
+    board_size: int = 400,
+    min_intensity: float = 0.3,
+    max_intensity: float = 1.0,
+    color_mode: str = "rgb",
+    channel_order: str = "rgb"
+) -> np.ndarray:
+    """Superpone en streaming una secuencia de tableros de longitud conocida.
+    
+    Variante de ``overlay_temporal_sequence`` que consume las posiciones de
+    un iterable (p. ej. ``iter_board_sequence``) y pliega cada fotograma en
+    el acumulador en cuanto se renderiza: en memoria solo hay un tablero,
+    un fotograma y el acumulador, sea cual sea el tamaño de la ventana.
+    
+    Los tableros se superponen con transparencia basada en antigüedad:
+    - Movimiento más reciente (última posición): intensidad máxima (brillante)
+    - Movimiento más antiguo (primera posición): intensidad mínima (oscuro)
+    
+    Parameters
+    ----------
+    boards : Iterable[chess.Board]
+        Tableros ordenados del más antiguo al más reciente. Cada tablero se
+        renderiza antes de pedir el siguiente, así que puede ser el mismo
+        objeto mutado.
+    num_boards : int
+        Número de tableros que producirá ``boards`` (necesario para la
+        rampa de intensidad antes de consumirlos).
+    compression_factor : int, optional
+        Factor de reducción de tamaño (default: 2).
+        1 = sin compresión, 2 = mitad de tamaño, 4 = cuarto de tamaño, etc.
+    board_size : int, optional
+        Tamaño del tablero antes de compresión (default: 400).
+    min_intensity : float, optional
+        Intensidad mínima para movimientos antiguos (default: 0.3).
+    max_intensity : float, optional
+        Intensidad máxima para movimientos recientes (default: 1.0).
+    color_mode : str, optional
+        "rgb", "gray" o "palette". En "palette" se acumula en gris y el
+        resultado se cuantiza con ``palette_lut`` (default: "rgb").
+    channel_order : str, optional
+        Orden de canales en modo "rgb": "rgb" o "bgr" (listo para
+        ``cv2.imwrite`` sin conversión) (default: "rgb").
+    
+    Returns
+    -------
+    np.ndarray
+        Imagen con superposición temporal.
+        Shape: (height, width, 3) en "rgb", (height, width) en
+        "gray"/"palette"; dtype: uint8
+    """
+    return overlay_temporal_pyramid(
+        boards,
+        num_boards,
+        (compression_factor,),
+        board_size=board_size,
+        min_intensity=min_intensity,
+        max_intensity=max_intensity,
+        color_mode=color_mode,
+        channel_order=channel_order
+    )[compression_factor]
+
+
+def overlay_temporal_pyramid(
+    boards: Iterable[chess.Board],
+    num_boards: int,
+    compression_factors: Sequence[int],
+    board_size: int = 400,
+    min_intensity: float = 0.3,
+    max_intensity: float = 1.0,
+    color_mode: str = "rgb",
+    channel_order: str = "rgb"
+) -> Dict[int, np.ndarray]:
+    """Superpone en streaming una secuencia de tableros a varias resoluciones.
+    
+    Cada tablero se renderiza una sola vez a ``board_size`` y se reduce en
+    cascada con ``cv2.INTER_AREA``: cada resolución parte de la anterior
+    más próxima cuyo tamaño sea múltiplo exacto del suyo (400 → 200 → 100),
+    o del fotograma completo si no hay ninguna. Cada resolución tiene su
+    propio acumulador, así que el resultado de cada factor equivale al de
+    ``overlay_temporal_stream`` con ese factor (salvo el redondeo de los
+    niveles intermedios de la cascada).
+    
+    Parameters
+    ----------
+    boards : Iterable[chess.Board]
+        Tableros ordenados del más antiguo al más reciente (ver
+        ``overlay_temporal_stream``).
+    num_boards : int
+        Número de tableros que producirá ``boards``.
+    compression_factors : Sequence[int]
+        Factores de reducción de tamaño a generar (>= 1, sin repetir).
+    board_size, min_intensity, max_intensity, color_mode, channel_order
+        Como en ``overlay_temporal_stream``.
+    
+    Returns
+    -------
+    Dict[int, np.ndarray]
+        ``{factor: imagen}`` en el orden de ``compression_factors``.
+    """
+    if num_boards < 1:
+        raise ValueError("[CHESS_CNN] num_boards debe ser >= 1")
+    
+    if not compression_factors:
+        raise ValueError("[CHESS_CNN] compression_factors no puede estar vacía")
+    
+    if len(set(compression_factors)) != len(compression_factors):
+        raise ValueError("[CHESS_CNN] compression_factors no puede tener repetidos")
+    
+    if min(compression_factors) < 1:
+        raise ValueError("[CHESS_CNN] compression_factor debe ser >= 1")
+    
+    if not (0.0 <= min_intensity <= max_intensity <= 1.0):
+        raise ValueError(
+            "[CHESS_CNN] Intensidades deben cumplir: 0 <= min <= max <= 1"
+        )
+    
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"[CHESS_CNN] color_mode desconocido: {color_mode}")
+    
+    # La paleta se aplica al final: se acumula en gris
+    render_mode = "gray" if color_mode == "palette" else color_mode
+    
+    # Niveles de la pirámide, de mayor a menor resolución. Cada nivel se
+    # reduce desde el nivel anterior más próximo con tamaño múltiplo del
+    # suyo (-1 = fotograma completo)
+    levels = sorted(compression_factors)
+    sizes = [board_size // factor for factor in levels]
+    sources = []
+    for k, size in enumerate(sizes):
+        source = -1
+        for prev in range(k - 1, -1, -1):
+            if sizes[prev] % size == 0:
+                source = prev
+                break
+        sources.append(source)
+    
+    # Inicializar imágenes acumuladas (float para precisión)
+    channels = (3,) if render_mode == "rgb" else ()
+    accumulated = [np.zeros((size, size) + channels, dtype=np.float32) for size in sizes]
+    weighted = [np.empty((size, size) + channels, dtype=np.float32) for size in sizes]
+    
+    # Procesar cada tablero en orden (antiguo → reciente)
+    rendered = 0
+    for i, board in enumerate(boards):
+        if i >= num_boards:
+            raise ValueError(
+                f"[CHESS_CNN] Se recibieron más de {num_boards} tableros"
+            )
+        
+        # Renderizar tablero a PNG
+        img_rgb = board_to_png_array(
+            board,
+            size=board_size,
+            color_mode=render_mode,
+            channel_order=channel_order
+        )
+        
+        # Calcular intensidad temporal
+        # i=0 (antiguo) → min_intensity
+        # i=num_boards-1 (reciente) → max_intensity
+        if num_boards > 1:
+            progress = i / (num_boards - 1)
+        else:
+            progress = 1.0
+        
+        intensity = min_intensity + (max_intensity - min_intensity) * progress
+        
+        frames = []
+        for k, size in enumerate(sizes):
+            # Aplicar compresión si es necesario (en cascada)
+            frame = img_rgb if sources[k] < 0 else frames[sources[k]]
+            if frame.shape[0] != size:
+                frame = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+            frames.append(frame)
+            
+            # Aplicar intensidad y acumular (en sitio, sin fotogramas extra)
+            np.multiply(frame, intensity, out=weighted[k], dtype=np.float32)
+            np.maximum(accumulated[k], weighted[k], out=accumulated[k])
+        rendered += 1
+    
+    if rendered < num_boards:
+        raise ValueError(
+            f"[CHESS_CNN] Se esperaban {num_boards} tableros, se recibieron {rendered}"
+        )
+    
+    results = {}
+    for factor, acc in zip(levels, accumulated):
+        # Convertir de vuelta a uint8
+        result = np.clip(acc, 0, 255).astype(np.uint8)
+        
+        if color_mode == "palette":
+            result = palette_lut()[0][result]
+        
+        results[factor] = result
+    
+    return {factor: results[factor] for factor in compression_factors}
+
+
+def extract_move_sequence(
+    pgn_text: Union[str, "CorpusGame"],
+    start_move: int,
+    end_move: int,
+    player_color: Optional[chess.Color] = None
+) -> np.ndarray:
+    """Extrae las jugadas de la ventana como array compacto, sin copiar tableros.
+    
+    Mismo criterio de ventana que ``extract_board_sequence``: la jugada
+    ``start_move`` produce la primera posición de la ventana y ``end_move``
+    la última.
+    
+    Parameters
+    ----------
+    pgn_text : Union[str, CorpusGame]
+        Texto completo del archivo PGN, o partida de un ``MoveCorpus``.
+    start_move : int
+        Número del movimiento inicial (más antiguo).
+    end_move : int
+        Número del movimiento final (más reciente).
+    player_color : Optional[chess.Color], optional
+        Si se indica, solo cuentan las jugadas de ese color (default: None).
+    
+    Returns
+    -------
+    np.ndarray
+        Array (n_moves, 4) int8 con columnas: casilla origen, casilla destino,
+        tipo de pieza movida (1=peón ... 6=rey) y captura (0/1).
+        Ordenado de la jugada más antigua a la más reciente.
+    """
+    return _window_move_array(_as_game(pgn_text), start_move, end_move, player_color)
+
+
+def _as_game(pgn_text: Union[str, "CorpusGame"]) -> Union[chess.pgn.Game, "CorpusGame"]:
+    """Parsea ``pgn_text`` salvo que ya sea una partida de un ``MoveCorpus``."""
+    if isinstance(pgn_text, CorpusGame):
+        return pgn_text
+    
+    game = chess.pgn.read_game(StringIO(pgn_text))
+    if game is None:
+        raise ValueError("[CHESS_CNN] No se pudo parsear el PGN")
+    return game
+
+
+def _window_move_array(
+    game: Union[chess.pgn.Game, "CorpusGame"],
+    start_move: int,
+    end_move: int,
+    player_color: Optional[chess.Color] = None
+) -> np.ndarray:
+    """Implementación de ``extract_move_sequence`` sobre una partida parseada."""
+    if start_move < 1 or end_move < start_move:
+        raise ValueError(
+            f"[CHESS_CNN] Rango de movimientos inválido: {start_move}-{end_move}"
+        )
+    
+    moves = np.zeros((end_move - start_move + 1, 4), dtype=np.int8)
+    board = game.board()
+    move_num = 0
+    
+    for move in game.mainline_moves():
+        mover = board.turn
+        
+        if player_color is None or mover == player_color:
+            move_num += 1
+            
+            if move_num >= start_move:
+                # Consultas sobre bitboards antes de aplicar la jugada
+                row = moves[move_num - start_move]
+                row[0] = move.from_square
+                row[1] = move.to_square
+                row[2] = board.piece_type_at(move.from_square)
+                row[3] = board.is_capture(move)
+            
+            if move_num >= end_move:
+                break
+        
+        board.push(move)
+    
+    if move_num < end_move:
+        raise _short_game_error(move_num, start_move, end_move, player_color)
+    
+    return moves
+
+
+def move_heatmap_sequence(
+    moves: np.ndarray,
+    compression_factor: int = 2,
+    board_size: int = 400,
+    min_intensity: float = 0.3,
+    max_intensity: float = 1.0,
+    upsample: bool = True
+) -> np.ndarray:
+    """Codifica una ventana de jugadas como mapa de calor 8x8 multicanal.
+    
+    Alternativa a ``overlay_temporal_sequence`` que no renderiza tableros:
+    cada jugada marca su casilla de origen, su casilla de destino, la
+    captura (si la hay) y el canal de su tipo de pieza (en la casilla de
+    destino), con la misma ponderación temporal que la superposición
+    (antigua → ``min_intensity``, reciente → ``max_intensity``) y
+    acumulación por máximo. Ver ``HEATMAP_CHANNELS`` para el orden de canales.
+    
+    Parameters
+    ----------
+    moves : np.ndarray
+        Array (n_moves, 4) devuelto por ``extract_move_sequence``.
+    compression_factor : int, optional
+        Factor de reducción de tamaño, como en la superposición (default: 2).
+    board_size : int, optional
+        Tamaño del tablero antes de compresión (default: 400).
+    min_intensity : float, optional
+        Intensidad mínima para movimientos antiguos (default: 0.3).
+    max_intensity : float, optional
+        Intensidad máxima para movimientos recientes (default: 1.0).
+    upsample : bool, optional
+        Escalar (vecino más próximo) al tamaño comprimido del tablero; si es
+        False se devuelve la rejilla 8x8 (default: True).
+    
+    Returns
+    -------
+    np.ndarray
+        Mapa de calor con fila 0 = fila 8 del tablero (como el SVG).
+        Shape: (height, width, len(HEATMAP_CHANNELS)), dtype: uint8
+    """
+    if len(moves) == 0:
+        raise ValueError("[CHESS_CNN] moves no puede estar vacío")
+    
+    if compression_factor < 1:
+        raise ValueError("[CHESS_CNN] compression_factor debe ser >= 1")
+    
+    if not (0.0 <= min_intensity <= max_intensity <= 1.0):
+        raise ValueError(
+            "[CHESS_CNN] Intensidades deben cumplir: 0 <= min <= max <= 1"
+        )
+    
+    moves = np.asarray(moves, dtype=np.int64)
+    num_moves = len(moves)
+    
+    # Misma rampa temporal que overlay_temporal_sequence
+    if num_moves > 1:
+        weights = np.linspace(min_intensity, max_intensity, num_moves, dtype=np.float32)
+    else:
+        weights = np.full(1, max_intensity, dtype=np.float32)
+    weights = np.round(weights * 255)
+    
+    # Casilla python-chess (a1=0) → celda de imagen (fila 8 arriba): sq ^ 56
+    from_cell = moves[:, 0] ^ 56
+    to_cell = moves[:, 1] ^ 56
+    piece_channel = moves[:, 2] + 2
+    captured = moves[:, 3].astype(bool)
+    
+    cells = np.concatenate([from_cell, to_cell, to_cell[captured], to_cell])
+    channels = np.concatenate([
+        np.zeros(num_moves, dtype=np.int64),
+        np.ones(num_moves, dtype=np.int64),
+        np.full(int(captured.sum()), 2, dtype=np.int64),
+        piece_channel
+    ])
+    values = np.concatenate([weights, weights, weights[captured], weights])
+    
+    grid = np.zeros((64, len(HEATMAP_CHANNELS)), dtype=np.float32)
+    np.maximum.at(grid, (cells, channels), values)
+    heatmap = grid.astype(np.uint8).reshape(8, 8, len(HEATMAP_CHANNELS))
+    
+    if not upsample:
+        return heatmap
+    
+    return upsample_heatmap(heatmap, compression_factor, board_size)
+
+
+def upsample_heatmap(
+    heatmap: np.ndarray,
+    compression_factor: int = 2,
+    board_size: int = 400
+) -> np.ndarray:
+    """Escala (vecino más próximo) un mapa de calor 8x8 al tamaño comprimido.
+    
+    Permite obtener varias resoluciones de una sola rejilla calculada con
+    ``move_heatmap_sequence(..., upsample=False)``.
+    
+    Parameters
+    ----------
+    heatmap : np.ndarray
+        Rejilla (8, 8, canales).
+    compression_factor : int, optional
+        Factor de reducción de tamaño (default: 2).
+    board_size : int, optional
+        Tamaño del tablero antes de compresión (default: 400).
+    
+    Returns
+    -------
+    np.ndarray
+        Shape: (board_size // compression_factor,) * 2 + (canales,)
+    """
+    compressed_size = board_size // compression_factor
+    if compressed_size % 8 == 0:
+        scale = compressed_size // 8
+        return np.repeat(np.repeat(heatmap, scale, axis=0), scale, axis=1)
+    
+    return np.stack([
+        cv2.resize(
+            heatmap[:, :, c],
+            (compressed_size, compressed_size),
+            interpolation=cv2.INTER_NEAREST
+        )
+        for c in range(heatmap.shape[2])
+    ], axis=2)
+
+
+# Marca de orden de bytes UTF-8 (exportaciones de ChessBase y Windows)
+_UTF8_BOM = b'\xef\xbb\xbf'
+
+# Nombres de etiqueta como en python-chess (``chess.pgn.TAG_REGEX``)
+_HEADER_LINE_RE = re.compile(rb'\[[A-Za-z0-9][A-Za-z0-9_+#=:-]*\s+"')
+_HEADER_RE = re.compile(r'\[([A-Za-z0-9][A-Za-z0-9_+#=:-]*)\s+"(.*)"\]\s*$')
+_COMMENT_RE = re.compile(r'\{[^}]*\}|;[^\n]*')
+_VARIATION_RE = re.compile(r'\([^()]*\)')
+_SAN_TOKEN_RE = re.compile(r'[A-Za-z]\S*|0-0(?:-0)?')
+
+
+class _QuietGameBuilder(chess.pgn.GameBuilder):
+    """GameBuilder que deja los errores en ``game.errors`` sin escribir logs."""
+    
+    def handle_error(self, error: Exception) -> None:
+        self.game.errors.append(error)
+
+
+def _comment_state(line: bytes, in_comment: bool) -> bool:
+    """Indica si al final de ``line`` se sigue dentro de un comentario ``{...}``.
+    
+    Fuera de un comentario ``{...}``, un ``;`` abre un comentario hasta fin
+    de línea: las llaves que le siguen no cuentan.
+    """
+    pos = 0
+    while True:
+        if in_comment:
+            pos = line.find(b'}', pos)
+        else:
+            brace = line.find(b'{', pos)
+            semicolon = line.find(b';', pos)
+            if semicolon >= 0 and (brace < 0 or semicolon < brace):
+                return False
+            pos = brace
+        if pos < 0:
+            return in_comment
+        in_comment = not in_comment
+        pos += 1
+
+
+def _decode_pgn(data: bytes) -> str:
+    """Decodifica una partida en UTF-8, o Latin-1 (habitual en ChessBase)."""
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def iter_pgn_games(pgn_path: Path) -> Iterator[Tuple[int, str]]:
+    """Divide un archivo PGN en partidas sin parsearlas.
+    
+    El archivo se lee en binario línea a línea, así que la memoria no
+    depende de su tamaño y cada partida lleva su posición exacta en bytes.
+    Una partida nueva empieza en una línea de cabecera (``[Tag "..."]``)
+    que sigue a texto de jugadas fuera de un comentario. Una marca BOM
+    UTF-8 al inicio del archivo se omite (como hace python-chess).
+    
+    Parameters
+    ----------
+    pgn_path : Path
+        Ruta al archivo PGN.
+    
+    Yields
+    ------
+    Tuple[int, str]
+        ``(offset, texto)``: byte donde empieza la partida y su texto PGN.
+    """
+    with open(pgn_path, 'rb') as pgn_file:
+        lines = []
+        start = 0
+        offset = 0
+        in_movetext = False
+        in_comment = False
+        
+        for line in pgn_file:
+            if offset == 0 and line.startswith(_UTF8_BOM):
+                # Los offsets siguen contando los bytes de la BOM
+                offset = len(_UTF8_BOM)
+                line = line[len(_UTF8_BOM):]
+            
+            if (in_movetext and not in_comment
+                    and _HEADER_LINE_RE.match(line)):
+                yield start, _decode_pgn(b''.join(lines))
+                lines = []
+                in_movetext = False
+            
+            if lines or line.strip():
+                if not lines:
+                    start = offset
+                lines.append(line)
+                
+                if in_comment or not _HEADER_LINE_RE.match(line):
+                    in_movetext = in_movetext or bool(line.strip())
+                    if in_comment or b'{' in line:
+                        in_comment = _comment_state(line, in_comment)
+            
+            offset += len(line)
+        
+        if lines:
+            yield start, _decode_pgn(b''.join(lines))
+
+
+def count_movetext_plies(movetext: str) -> int:
+    """Cuenta las medias jugadas de la línea principal sin resolver SAN.
+    
+    Elimina comentarios y variantes y cuenta los tokens de jugada. Un
+    token no estándar puede sobrecontar, pero nunca se subcuenta una
+    jugada válida, así que sirve para descartar partidas cortas.
+    """
+    text = _COMMENT_RE.sub(' ', movetext)
+    
+    # Variantes anidadas: eliminar de dentro hacia fuera
+    previous = None
+    while previous != text:
+        previous, text = text, _VARIATION_RE.sub(' ', text)
+    
+    return len(_SAN_TOKEN_RE.findall(text))
+
+
+def precheck_pgn_game(
+    pgn_text: str,
+    player_name: str,
+    end_move: int,
+    player_moves_only: bool = False
+) -> Tuple[Optional[str], str, Optional[chess.Color]]:
+    """Clasifica una partida antes de parsearla con python-chess.
+    
+    Detecta sin excepciones y sin resolver SAN los descartes más comunes:
+    cabeceras mal formadas, jugador no identificable y partida demasiado
+    corta para la ventana.
+    
+    Parameters
+    ----------
+    pgn_text : str
+        Texto PGN de una partida (ver ``iter_pgn_games``).
+    player_name : str
+        Nombre del jugador objetivo.
+    end_move : int
+        Último movimiento de la ventana.
+    player_moves_only : bool, optional
+        Contar solo las jugadas del jugador (default: False).
+    
+    Returns
+    -------
+    Tuple[Optional[str], str, Optional[chess.Color]]
+        ``(motivo, detalle, color)``: ``motivo`` es None si la partida
+        pasa el filtro o uno de ``REJECT_REASONS``; ``color`` es el color
+        del jugador en modo por jugador.
+    """
+    bad_line, headers, plies = _split_pgn_game(pgn_text)
+    if bad_line is not None:
+        return "malformed_headers", bad_line, None
+    
+    return _precheck_window(headers, plies, player_name, end_move, player_moves_only)
+
+
+def _split_pgn_game(pgn_text: str) -> Tuple[Optional[str], Dict[str, str], int]:
+    """Separa cabeceras y movetext de una partida sin resolver SAN.
+    
+    Returns
+    -------
+    Tuple[Optional[str], Dict[str, str], int]
+        ``(línea de cabecera mal formada o None, cabeceras, medias jugadas)``.
+    """
+    headers = {}
+    movetext_lines = []
+    
+    if pgn_text.startswith('\ufeff'):
+        pgn_text = pgn_text[1:]
+    
+    for line in pgn_text.splitlines():
+        if not movetext_lines and line.startswith('['):
+            match = _HEADER_RE.match(line)
+            if match is None:
+                return line.strip(), headers, 0
+            headers[match.group(1)] = match.group(2)
+        elif movetext_lines or line.strip():
+            movetext_lines.append(line)
+    
+    return None, headers, count_movetext_plies("\n".join(movetext_lines))
+
+
+def _precheck_window(
+    headers: Mapping[str, str],
+    plies: int,
+    player_name: str,
+    end_move: int,
+    player_moves_only: bool = False
+) -> Tuple[Optional[str], str, Optional[chess.Color]]:
+    """Descartes de ``precheck_pgn_game`` que dependen del jugador y la ventana."""
+    player_color = None
+    if player_moves_only:
+        player_color = resolve_player_color(headers, player_name)
+        if player_color is None:
+            return (
+                "unknown_player",
+                f"{headers.get('White', '?')} - {headers.get('Black', '?')}",
+                None
+            )
+    
+    fen_fields = headers.get("FEN", "").split()
+    first_mover = chess.BLACK if fen_fields[1:2] == ["b"] else chess.WHITE
+    
+    available = _player_move_count(plies, first_mover, player_color)
+    if available < end_move:
+        return "too_short", f"{available} < {end_move}", player_color
+    
+    return None, "", player_color
+
+
+def _parse_error(game: chess.pgn.Game) -> Tuple[Optional[str], str]:
+    """Motivo y detalle del primer error de parseo de ``game`` (None si no hay)."""
+    if not game.errors:
+        return None, ""
+    
+    error = game.errors[0]
+    if isinstance(error, (chess.IllegalMoveError, chess.AmbiguousMoveError,
+                          chess.InvalidMoveError)):
+        return "illegal_move", str(error)
+    return "malformed_headers", str(error)
+
+
+class RejectLog:
+    """Registro de partidas descartadas, por motivo.
+    
+    Cuenta los descartes por motivo en ``counts`` y, si se indica ``path``,
+    los escribe en un TSV con columnas ``COLUMNS`` (archivo PGN, byte de
+    inicio de la partida, número de partida, motivo y detalle). Es seguro
+    usarlo desde el hilo escritor.
+    
+    Parameters
+    ----------
+    path : Optional[Path], optional
+        Archivo TSV de descartes; None para solo contar (default: None).
+    """
+    
+    COLUMNS = ("file", "offset", "game", "reason", "detail")
+    
+    def __init__(self, path: Optional[Path] = None):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._file = None
+        
+        if path is not None:
+            self._file = open(path, 'w', encoding='utf-8')
+            self._file.write("\t".join(self.COLUMNS) + "\n")
+    
+    def record(
+        self,
+        pgn_path: Path,
+        offset: int,
+        game_num: int,
+        reason: str,
+        detail: str = ""
+    ) -> None:
+        """Registra un descarte."""
+        detail = " ".join(detail.split())
+        with self._lock:
+            self.counts[reason] += 1
+            if self._file is not None:
+                self._file.write(
+                    f"{pgn_path}\t{offset}\t{game_num}\t{reason}\t{detail}\n"
+                )
+    
+    def total(self) -> int:
+        """Número total de descartes registrados."""
+        return sum(self.counts.values())
+    
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def __enter__(self) -> "RejectLog":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CorpusGame:
+    """Partida leída de un ``MoveCorpus``, con las jugadas ya resueltas.
+    
+    Sustituye a ``chess.pgn.Game`` en ``iter_board_sequence``,
+    ``extract_board_sequence`` y ``extract_move_sequence``: ofrece
+    ``headers``, ``board()`` y ``mainline_moves()``, sin árbol de nodos ni
+    resolución de SAN.
+    
+    Parameters
+    ----------
+    game_num : int
+        Número de la partida en su archivo PGN (desde 1).
+    offset : int
+        Byte de inicio de la partida en el archivo PGN.
+    headers : Dict[str, str]
+        Cabeceras PGN.
+    moves : List[chess.Move]
+        Jugadas de la línea principal.
+    row : Optional[int], optional
+        Fila de la partida en el corpus (identificador de partida de
+        ``PositionTable``) (default: None).
+    """
+    
+    def __init__(
+        self,
+        game_num: int,
+        offset: int,
+        headers: Dict[str, str],
+        moves: List[chess.Move],
+        row: Optional[int] = None
+    ):
+        self.game_num = game_num
+        self.offset = offset
+        self.headers = headers
+        self.moves = moves
+        self.row = row
+    
+    def board(self) -> chess.Board:
+        """Posición inicial (cabeceras ``FEN``/``Variant``, como python-chess)."""
+        return chess.pgn.Headers(self.headers).board()
+    
+    def mainline_moves(self) -> List[chess.Move]:
+        return self.moves
+
+
+@lru_cache(maxsize=1)
+def _corpus_move_table() -> List[chess.Move]:
+    """Jugada de cada código de 15 bits de ``MoveCorpus``."""
+    return [
+        chess.Move(code & 63, (code >> 6) & 63, (code >> 12) + 1 if code >> 12 else None)
+        for code in range(1 << 15)
+    ]
+
+
+class MoveCorpus:
+    """Corpus binario de partidas para releer sin resolver SAN.
+    
+    ``build_move_corpus`` lo genera una vez desde los PGN; después
+    ``process_pgn_file(..., corpus=...)`` y ``extract_board_sequence``
+    reproducen las partidas con ``board.push`` a partir de códigos de jugada,
+    sin ``chess.pgn.read_game``. Directorio::
+    
+        meta.json      formato, versión, identificador de generación y archivos
+                       PGN de origen
+        moves.bin      códigos uint16 de todas las jugadas, partida tras partida:
+                       origen | destino << 6 | (promoción - 1) << 12
+        games.npy      tabla de partidas (``GAME_DTYPE``), una fila por partida
+        headers.jsonl  cabeceras de cada partida (y detalle del descarte)
+        positions/     tabla de posiciones opcional (ver ``PositionTable``)
+    
+    ``moves.bin`` y ``games.npy`` se abren como memmap; las cabeceras se leen
+    por offset. Las partidas descartadas al generar el corpus (cabeceras mal
+    formadas, jugadas ilegales) se conservan sin jugadas para que los
+    descartes y la numeración coincidan con los del PGN.
+    
+    Parameters
+    ----------
+    root : Path
+        Directorio del corpus.
+    """
+    
+    FORMAT = "chess-cnn-moves"
+    VERSION = 1
+    META_NAME = "meta.json"
+    MOVES_NAME = "moves.bin"
+    GAMES_NAME = "games.npy"
+    HEADERS_NAME = "headers.jsonl"
+    
+    GAME_DTYPE = np.dtype([
+        ("file", "<u2"),            # índice en meta.json["files"]
+        ("game", "<u4"),            # número de partida en el archivo (desde 1)
+        ("offset", "<u8"),          # byte de inicio en el archivo PGN
+        ("moves_start", "<u8"),     # primer código en moves.bin
+        ("num_moves", "<u4"),       # jugadas de la línea principal guardadas
+        ("text_plies", "<u4"),      # medias jugadas del movetext (precheck)
+        ("headers_offset", "<u8"),  # byte de la línea en headers.jsonl
+        ("reject", "u1"),           # 0 = válida; i + 1 = REJECT_REASONS[i]
+        ("parsed", "?"),            # el descarte se produjo al parsear
+    ])
+    
+    def __init__(self, root: Path):
+        self.root = root
+        
+        try:
+            with open(root / self.META_NAME, encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"[CHESS_CNN] No es un corpus de jugadas: {root}")
+        
+        if meta.get("format") != self.FORMAT or meta.get("version") != self.VERSION:
+            raise ValueError(
+                f"[CHESS_CNN] Formato de corpus no soportado: "
+                f"{meta.get('format')} v{meta.get('version')}"
+            )
+        
+        self.files = meta["files"]
+        self.build_id = meta.get("build_id")
+        self.games = np.load(root / self.GAMES_NAME, mmap_mode='r')
+        
+        moves_path = root / self.MOVES_NAME
+        self._moves_bytes = moves_path.stat().st_size
+        if self._moves_bytes:
+            self.moves = np.memmap(moves_path, dtype='<u2', mode='r')
+        else:
+            self.moves = np.zeros(0, dtype='<u2')
+        
+        self._headers = open(root / self.HEADERS_NAME, 'rb')
+        
+        # Tabla de posiciones precalculada, si se generó para este corpus
+        self.positions = None
+        positions_dir = root / PositionTable.DIR_NAME
+        if (positions_dir / PositionTable.META_NAME).exists():
+            try:
+                self.positions = PositionTable(positions_dir, fingerprint=self.fingerprint())
+            except ValueError as e:
+                print(f"⚠ {e}: se ignora (regenerar con --build-positions)", file=sys.stderr)
+        
+        # Filas de cada archivo: el corpus se escribe archivo a archivo
+        file_ids = np.asarray(self.games["file"])
+        bounds = np.searchsorted(file_ids, np.arange(len(self.files) + 1))
+        self._file_rows = {
+            name: range(bounds[i], bounds[i + 1]) for i, name in enumerate(self.files)
+        }
+    
+    def __len__(self) -> int:
+        return len(self.games)
+    
+    def fingerprint(self) -> Dict[str, Any]:
+        """Identifica esta generación del corpus (ver ``PositionTable``)."""
+        return {"build_id": self.build_id, "games": len(self.games), "moves_bytes": self._moves_bytes}
+    
+    def file_rows(self, pgn_path: Path) -> range:
+        """Filas de ``games`` de un archivo PGN (ruta tal como se indexó)."""
+        try:
+            return self._file_rows[str(pgn_path)]
+        except KeyError:
+            raise ValueError(f"[CHESS_CNN] Archivo no incluido en el corpus: {pgn_path}")
+    
+    def entry(self, row: int) -> Dict[str, Any]:
+        """Línea de ``headers.jsonl`` de una fila: ``{"headers": ..., "detail": ...}``."""
+        self._headers.seek(int(self.games[row]["headers_offset"]))
+        return json.loads(self._headers.readline())
+    
+    def move_codes(self, row: int) -> np.ndarray:
+        """Códigos de las jugadas de una fila (vista sobre el memmap)."""
+        start = int(self.games[row]["moves_start"])
+        return self.moves[start:start + int(self.games[row]["num_moves"])]
+    
+    def game(self, row: int, headers: Optional[Dict[str, str]] = None) -> CorpusGame:
+        """Partida de una fila, lista para ``iter_board_sequence``."""
+        record = self.games[row]
+        if headers is None:
+            headers = self.entry(row)["headers"]
+        
+        table = _corpus_move_table()
+        moves = [table[code] for code in self.move_codes(row).tolist()]
+        return CorpusGame(int(record["game"]), int(record["offset"]), headers, moves, row=row)
+    
+    def close(self) -> None:
+        self._headers.close()
+    
+    def __enter__(self) -> "MoveCorpus":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def encode_corpus_move(move: chess.Move) -> int:
+    """Código uint16 de una jugada (ver ``MoveCorpus``)."""
+    promotion = move.promotion - 1 if move.promotion else 0
+    return move.from_square | (move.to_square << 6) | (promotion << 12)
+
+
+def build_move_corpus(pgn_paths: Iterable[Path], corpus_dir: Path) -> Tuple[int, int]:
+    """Convierte archivos PGN en un ``MoveCorpus`` (se parsea una sola vez).
+    
+    ``meta.json`` se escribe al final, así que un corpus a medio generar no
+    se puede abrir. Una tabla de posiciones previa en el directorio se
+    borra, porque ya no corresponde al corpus.
+    
+    Parameters
+    ----------
+    pgn_paths : Iterable[Path]
+        Archivos PGN; se indexan con la ruta tal como se indica, que es la
+        que usarán ``process_pgn_file`` y ``rejects.tsv``.
+    corpus_dir : Path
+        Directorio de salida (se sobrescribe un corpus existente).
+    
+    Returns
+    -------
+    Tuple[int, int]
+        ``(partidas indexadas, partidas descartadas)``.
+    """
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    (corpus_dir / MoveCorpus.META_NAME).unlink(missing_ok=True)
+    shutil.rmtree(corpus_dir / PositionTable.DIR_NAME, ignore_errors=True)
+    
+    files = []
+    rows = []
+    moves_written = 0
+    rejected = 0
+    
+    with open(corpus_dir / MoveCorpus.MOVES_NAME, 'wb') as moves_file, \
+            open(corpus_dir / MoveCorpus.HEADERS_NAME, 'wb') as headers_file:
+        for file_id, pgn_path in enumerate(pgn_paths):
+            files.append(str(pgn_path))
+            file_games = 0
+            
+            game_num = 0
+            for offset, pgn_text in iter_pgn_games(pgn_path):
+                game_num += 1
+                file_games += 1
+                
+                bad_line, headers, plies = _split_pgn_game(pgn_text)
+                codes = []
+                parsed = False
+                
+                if bad_line is not None:
+                    reason, detail = "malformed_headers", bad_line
+                else:
+                    game = chess.pgn.read_game(StringIO(pgn_text), Visitor=_QuietGameBuilder)
+                    reason, detail = _parse_error(game)
+                    parsed = reason is not None
+                    if reason is None:
+                        codes = [encode_corpus_move(move) for move in game.mainline_moves()]
+                
+                if reason is not None:
+                    rejected += 1
+                
+                rows.append((
+                    file_id, game_num, offset, moves_written, len(codes), plies,
+                    headers_file.tell(),
+                    REJECT_REASONS.index(reason) + 1 if reason else 0, parsed
+                ))
+                
+                entry = {"headers": headers}
+                if detail:
+                    entry["detail"] = detail
+                headers_file.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b"\n")
+                
+                moves_file.write(np.asarray(codes, dtype='<u2').tobytes())
+                moves_written += len(codes)
+            
+            print(f"✓ {pgn_path.name}: {file_games} partidas")
+    
+    np.save(corpus_dir / MoveCorpus.GAMES_NAME, np.array(rows, dtype=MoveCorpus.GAME_DTYPE))
+    
+    with open(corpus_dir / MoveCorpus.META_NAME, 'w', encoding='utf-8') as f:
+        json.dump({
+            "format": MoveCorpus.FORMAT,
+            "version": MoveCorpus.VERSION,
+            "build_id": os.urandom(8).hex(),
+            "files": files
+        }, f, indent=2)
+    
+    return len(rows), rejected
+
+
+class PositionTable:
+    """Tabla columnar de posiciones de un ``MoveCorpus``, por partida y jugada.
+    
+    ``build_position_table`` reproduce cada partida una sola vez y guarda,
+    para cada posición (la inicial y la siguiente a cada media jugada), las
+    columnas::
+    
+        bitboards.npy  (n, 12) uint64: peón, caballo, alfil, torre, dama, rey
+                       blancos y después negros
+        turn.npy       (n,) bool: bando al que le toca mover
+        from_sq.npy    (n,) uint8: casilla de origen de la jugada que lleva a
+                       la posición (NO_SQUARE en la inicial)
+        to_sq.npy      (n,) uint8: casilla de destino (ídem)
+        zobrist.npy    (n,) uint64: hash Zobrist (polyglot)
+        index.npy      (partidas, 2) int64: filas [inicio, fin) de cada partida
+    
+    El identificador de partida es su fila en el corpus (``CorpusGame.row``);
+    las partidas descartadas tienen un rango vacío. ``meta.json`` guarda la
+    huella del corpus (``MoveCorpus.fingerprint``) para detectar una tabla
+    de una generación anterior del corpus. Todas las columnas se
+    abren como memmap: elegir una ventana es un slice (``window_rows``) y
+    los codificadores leen posiciones sin reproducir jugadas
+    (``move_array``, ``iter_boards``).
+    
+    Parameters
+    ----------
+    root : Path
+        Directorio de la tabla (``positions/`` dentro del corpus).
+    fingerprint : Optional[Dict[str, Any]], optional
+        Huella del corpus esperada; si no coincide con la de la tabla se
+        lanza ValueError (default: None, sin comprobar).
+    """
+    
+    FORMAT = "chess-cnn-positions"
+    VERSION = 1
+    DIR_NAME = "positions"
+    META_NAME = "meta.json"
+    COLUMNS = ("bitboards", "turn", "from_sq", "to_sq", "zobrist")
+    NO_SQUARE = 64
+    
+    # Orden de los 12 bitboards: (color, tipo de pieza)
+    PIECES = tuple(
+        (color, piece_type)
+        for color in (chess.WHITE, chess.BLACK)
+        for piece_type in chess.PIECE_TYPES
+    )
+    
+    def __init__(self, root: Path, fingerprint: Optional[Dict[str, Any]] = None):
+        self.root = root
+        
+        with open(root / self.META_NAME, encoding='utf-8') as f:
+            meta = json.load(f)
+        
+        if meta.get("format") != self.FORMAT or meta.get("version") != self.VERSION:
+            raise ValueError(
+                f"[CHESS_CNN] Formato de tabla de posiciones no soportado: "
+                f"{meta.get('format')} v{meta.get('version')}"
+            )
+        
+        if fingerprint is not None and meta.get("corpus") != fingerprint:
+            raise ValueError(f"[CHESS_CNN] La tabla de posiciones de {root} no corresponde al corpus")
+        
+        self.index = np.load(root / "index.npy", mmap_mode='r')
+        for column in self.COLUMNS:
+            setattr(self, column, np.load(root / f"{column}.npy", mmap_mode='r'))
+    
+    def __len__(self) -> int:
+        return len(self.turn)
+    
+    def game_rows(self, game_id: int) -> range:
+        """Filas de una partida: posición inicial y tras cada media jugada."""
+        start, stop = self.index[game_id]
+        return range(int(start), int(stop))
+    
+    def window_rows(
+        self,
+        game_id: int,
+        start_move: int,
+        end_move: int,
+        player_color: Optional[chess.Color] = None
+    ) -> np.ndarray:
+        """Filas de la ventana, con el criterio de ``iter_board_sequence``.
+        
+        Parameters
+        ----------
+        game_id : int
+            Fila de la partida en el corpus.
+        start_move : int
+            Número del movimiento inicial (más antiguo).
+        end_move : int
+            Número del movimiento final (más reciente).
+        player_color : Optional[chess.Color], optional
+            Si se indica, solo cuentan las jugadas de ese color (default: None).
+        
+        Returns
+        -------
+        np.ndarray
+            Índices (int64) de las posiciones tras cada jugada de la ventana,
+            de la más antigua a la más reciente.
+        """
+        if start_move < 1 or end_move < start_move:
+            raise ValueError(
+                f"[CHESS_CNN] Rango de movimientos inválido: {start_move}-{end_move}"
+            )
+        
+        rows = self.game_rows(game_id)
+        
+        if player_color is None:
+            window = np.arange(rows.start + start_move, rows.start + end_move + 1)
+            available = len(rows) - 1
+        else:
+            # Posiciones tras una jugada de player_color: le toca al rival
+            moved = np.flatnonzero(self.turn[rows.start + 1:rows.stop] != player_color)
+            window = moved[start_move - 1:end_move] + rows.start + 1
+            available = len(moved)
+        
+        if available < end_move:
+            raise _short_game_error(available, start_move, end_move, player_color)
+        
+        return window
+    
+    def move_array(self, rows: np.ndarray) -> np.ndarray:
+        """Jugadas que llevan a ``rows``, como ``extract_move_sequence``.
+        
+        Vectorizado sobre los bitboards de la posición anterior a cada
+        jugada: la pieza movida es la que ocupa la casilla de origen y hay
+        captura si el destino lo ocupa el rival o la jugada es al paso.
+        
+        Parameters
+        ----------
+        rows : np.ndarray
+            Filas devueltas por ``window_rows``.
+        
+        Returns
+        -------
+        np.ndarray
+            Array (n_moves, 4) int8: origen, destino, tipo de pieza y captura.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        from_sq = np.asarray(self.from_sq[rows], dtype=np.uint64)
+        to_sq = np.asarray(self.to_sq[rows], dtype=np.uint64)
+        before = np.asarray(self.bitboards[rows - 1])
+        mover_white = np.asarray(self.turn[rows - 1])
+        
+        # (n, 12) bits de las casillas de origen y destino antes de la jugada
+        from_bits = (before >> from_sq[:, None]) & np.uint64(1)
+        to_bits = (before >> to_sq[:, None]) & np.uint64(1)
+        
+        piece = from_bits.argmax(axis=1) % 6 + 1
+        
+        # Bitboards del rival: negras (6-11) si mueven blancas y viceversa
+        rival = np.where(mover_white[:, None], to_bits[:, 6:], to_bits[:, :6])
+        en_passant = (piece == chess.PAWN) & (from_sq % np.uint64(8) != to_sq % np.uint64(8)) \
+            & (to_bits.sum(axis=1) == 0)
+        capture = rival.any(axis=1) | en_passant
+        
+        return np.stack([from_sq, to_sq, piece, capture], axis=1).astype(np.int8)
+    
+    def board(self, row: int) -> chess.Board:
+        """Tablero de una fila (piezas y turno; sin enroques ni al paso)."""
+        bitboards = [int(bb) for bb in self.bitboards[row]]
+        board = chess.Board.empty()
+        
+        board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings = (
+            bitboards[i] | bitboards[i + 6] for i in range(6)
+        )
+        board.occupied_co[chess.WHITE] = 0
+        board.occupied_co[chess.BLACK] = 0
+        for bb, (color, _) in zip(bitboards, self.PIECES):
+            board.occupied_co[color] |= bb
+        board.occupied = board.occupied_co[chess.WHITE] | board.occupied_co[chess.BLACK]
+        board.turn = bool(self.turn[row])
+        
+        return board
+    
+    def iter_boards(self, rows: np.ndarray) -> Iterator[chess.Board]:
+        """Tableros de ``rows``, para ``overlay_temporal_stream`` y similares."""
+        for row in rows:
+            yield self.board(int(row))
+
+
+def build_position_table(corpus: MoveCorpus) -> int:
+    """Genera la ``PositionTable`` de un corpus en ``<corpus>/positions/``.
+    
+    Cada partida válida se reproduce una sola vez (sin SAN). El número de
+    filas se conoce de antemano por la tabla de partidas del corpus, así
+    que las columnas se escriben directamente en memmaps de su tamaño
+    final. ``meta.json`` se escribe al final.
+    
+    Parameters
+    ----------
+    corpus : MoveCorpus
+        Corpus de origen.
+    
+    Returns
+    -------
+    int
+        Número de posiciones escritas.
+    """
+    root = corpus.root / PositionTable.DIR_NAME
+    root.mkdir(parents=True, exist_ok=True)
+    (root / PositionTable.META_NAME).unlink(missing_ok=True)
+    
+    # Filas por partida: posición inicial + una por jugada (0 si se descartó)
+    valid = np.asarray(corpus.games["reject"]) == 0
+    counts = np.where(valid, np.asarray(corpus.games["num_moves"], dtype=np.int64) + 1, 0)
+    stops = np.cumsum(counts)
+    index = np.stack([stops - counts, stops], axis=1)
+    total = int(stops[-1]) if len(stops) else 0
+    np.save(root / "index.npy", index)
+    
+    shapes = {
+        "bitboards": ((total, 12), np.uint64),
+        "turn": ((total,), np.bool_),
+        "from_sq": ((total,), np.uint8),
+        "to_sq": ((total,), np.uint8),
+        "zobrist": ((total,), np.uint64),
+    }
+    columns = {
+        name: np.lib.format.open_memmap(root / f"{name}.npy", mode='w+', dtype=dtype, shape=shape)
+        for name, (shape, dtype) in shapes.items()
+    }
+    
+    for game_id in np.flatnonzero(valid):
+        game = corpus.game(int(game_id))
+        board = game.board()
+        start, stop = index[game_id]
+        
+        bitboards = []
+        turns = []
+        hashes = []
+        for ply in range(stop - start):
+            if ply:
+                board.push(game.moves[ply - 1])
+            bitboards.append([board.pieces_mask(piece_type, color)
+                              for color, piece_type in PositionTable.PIECES])
+            turns.append(board.turn)
+            hashes.append(chess.polyglot.zobrist_hash(board))
+        
+        codes = corpus.move_codes(int(game_id))
+        columns["bitboards"][start:stop] = np.array(bitboards, dtype=np.uint64)
+        columns["turn"][start:stop] = turns
+        columns["zobrist"][start:stop] = np.array(hashes, dtype=np.uint64)
+        columns["from_sq"][start] = columns["to_sq"][start] = PositionTable.NO_SQUARE
+        columns["from_sq"][start + 1:stop] = codes & 63
+        columns["to_sq"][start + 1:stop] = (codes >> 6) & 63
+    
+    for column in columns.values():
+        column.flush()
+    del columns
+    
+    with open(root / PositionTable.META_NAME, 'w', encoding='utf-8') as f:
+        json.dump({
+            "format": PositionTable.FORMAT,
+            "version": PositionTable.VERSION,
+            "corpus": corpus.fingerprint()
+        }, f, indent=2)
+    
+    return total
+
+
+class Codec(ABC):
+    """Códec de salida: convierte un array en bytes y viceversa sin pérdidas.
+    
+    Las subclases definen ``name``, ``extension``, ``encode`` y ``decode``.
+    Las imágenes se reciben en el orden de canales de OpenCV (BGR).
+    """
+    
+    name = ""
+    extension = ""
+    
+    @abstractmethod
+    def encode(self, array: np.ndarray) -> bytes:
+        """Codifica ``array`` en bytes."""
+    
+    @abstractmethod
+    def decode(self, data: bytes) -> np.ndarray:
+        """Decodifica los bytes de ``encode``."""
+    
+    def write(self, path: Path, array: np.ndarray) -> None:
+        """Codifica ``array`` y lo escribe en ``path``."""
+        with open(path, 'wb') as f:
+            f.write(self.encode(array))
+    
+    def read(self, path: Path) -> np.ndarray:
+        """Lee y decodifica ``path``."""
+        with open(path, 'rb') as f:
+            return self.decode(f.read())
+
+
+def _check_image_array(array: np.ndarray, codec: str) -> None:
+    """Valida que un array sea representable como imagen de 8 bits."""
+    channels = 1 if array.ndim == 2 else array.shape[2] if array.ndim == 3 else 0
+    if array.dtype != np.uint8 or channels not in (1, 3, 4):
+        raise ValueError(
+            f"[CHESS_CNN] {codec} solo admite uint8 con 1, 3 o 4 canales "
+            f"(recibido {array.dtype} {array.shape}); usar npy o packed"
+        )
+
+
+class PngCodec(Codec):
+    """PNG con nivel de compresión, filtro y estrategia zlib configurables.
+    
+    Parameters
+    ----------
+    level : Optional[int], optional
+        Nivel zlib 0-9; None usa el de OpenCV (default: None).
+    png_filter : Optional[str], optional
+        Filtro PNG: "none", "sub", "up", "avg", "paeth", "fast" o "all";
+        None usa el de OpenCV (default: None). Requiere OpenCV >= 4.11.
+    strategy : Optional[str], optional
+        Estrategia zlib: "default", "filtered", "huffman", "rle" o "fixed".
+        "rle" suele ser la más rápida en imágenes con zonas planas
+        (default: None).
+    """
+    
+    name = "png"
+    extension = ".png"
+    
+    FILTERS = {
+        "none": "IMWRITE_PNG_FILTER_NONE", "sub": "IMWRITE_PNG_FILTER_SUB",
+        "up": "IMWRITE_PNG_FILTER_UP", "avg": "IMWRITE_PNG_FILTER_AVG",
+        "paeth": "IMWRITE_PNG_FILTER_PAETH", "fast": "IMWRITE_PNG_FAST_FILTERS",
+        "all": "IMWRITE_PNG_ALL_FILTERS"
+    }
+    STRATEGIES = {
+        "default": "IMWRITE_PNG_STRATEGY_DEFAULT", "filtered": "IMWRITE_PNG_STRATEGY_FILTERED",
+        "huffman": "IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY", "rle": "IMWRITE_PNG_STRATEGY_RLE",
+        "fixed": "IMWRITE_PNG_STRATEGY_FIXED"
+    }
+    
+    def __init__(
+        self,
+        level: Optional[int] = None,
+        png_filter: Optional[str] = None,
+        strategy: Optional[str] = None
+    ):
+        self.params = []
+        
+        if level is not None:
+            if not 0 <= level <= 9:
+                raise ValueError("[CHESS_CNN] El nivel PNG debe estar entre 0 y 9")
+            self.params += [cv2.IMWRITE_PNG_COMPRESSION, level]
+        
+        if png_filter is not None:
+            if png_filter not in self.FILTERS:
+                raise ValueError(f"[CHESS_CNN] Filtro PNG desconocido: {png_filter}")
+            if not hasattr(cv2, "IMWRITE_PNG_FILTER"):
+                raise ValueError("[CHESS_CNN] Esta versión de OpenCV no permite elegir el filtro PNG")
+            self.params += [cv2.IMWRITE_PNG_FILTER, getattr(cv2, self.FILTERS[png_filter])]
+        
+        if strategy is not None:
+            if strategy not in self.STRATEGIES:
+                raise ValueError(f"[CHESS_CNN] Estrategia PNG desconocida: {strategy}")
+            self.params += [cv2.IMWRITE_PNG_STRATEGY, getattr(cv2, self.STRATEGIES[strategy])]
+    
+    def encode(self, array: np.ndarray) -> bytes:
+        _check_image_array(array, self.name)
+        ok, buffer = cv2.imencode(self.extension, array, self.params)
+        if not ok:
+            raise IOError("[CHESS_CNN] No se pudo codificar PNG")
+        return buffer.tobytes()
+    
+    def decode(self, data: bytes) -> np.ndarray:
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+class WebpCodec(Codec):
+    """WebP sin pérdidas.
+    
+    WebP siempre almacena color: una imagen de 1 canal se guarda con los
+    tres canales iguales. ``decode`` la devuelve de 1 canal si
+    ``channels=1`` o, con ``channels=None``, si los tres canales
+    decodificados son iguales (una imagen "rgb" de grises puros también
+    se devolvería de 1 canal; las de los modos de color no lo son).
+    
+    Parameters
+    ----------
+    channels : Optional[int], optional
+        Canales de las imágenes, 1 o 3; None los deduce al decodificar
+        (default: None).
+    """
+    
+    name = "webp"
+    extension = ".webp"
+    
+    def __init__(self, channels: Optional[int] = None):
+        if channels not in (None, 1, 3):
+            raise ValueError("[CHESS_CNN] WebP: channels debe ser 1, 3 o None")
+        self.channels = channels
+    
+    def encode(self, array: np.ndarray) -> bytes:
+        _check_image_array(array, self.name)
+        # Calidad > 100 activa el modo sin pérdidas
+        ok, buffer = cv2.imencode(self.extension, array, [cv2.IMWRITE_WEBP_QUALITY, 101])
+        if not ok:
+            raise IOError("[CHESS_CNN] No se pudo codificar WebP")
+        return buffer.tobytes()
+    
+    def decode(self, data: bytes) -> np.ndarray:
+        flag = cv2.IMREAD_GRAYSCALE if self.channels == 1 else cv2.IMREAD_UNCHANGED
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+        
+        if (self.channels is None and img.ndim == 3 and img.shape[2] == 3
+                and (img[:, :, 0] == img[:, :, 1]).all() and (img[:, :, 1] == img[:, :, 2]).all()):
+            # Guardada desde 1 canal (modos "gray" y "palette")
+            img = np.ascontiguousarray(img[:, :, 0])
+        
+        return img
+
+
+class NpyCodec(Codec):
+    """Array numpy sin comprimir (``.npy``); admite cualquier dtype y shape."""
+    
+    name = "npy"
+    extension = ".npy"
+    
+    def encode(self, array: np.ndarray) -> bytes:
+        buffer = BytesIO()
+        np.save(buffer, array)
+        return buffer.getvalue()
+    
+    def decode(self, data: bytes) -> np.ndarray:
+        return np.load(BytesIO(data))
+
+
+class PackedCodec(Codec):
+    """Array empaquetado con compresión rápida (LZ4, o zlib nivel 1).
+    
+    Formato: ``CPK1``, compresor (1 byte: ``l``=LZ4, ``z``=zlib), dtype
+    (1 byte de longitud + texto), ndim (1 byte), shape (uint32 LE por eje)
+    y los bytes del array comprimidos.
+    
+    Parameters
+    ----------
+    compressor : Optional[str], optional
+        "lz4" (requiere ``pip install lz4``) o "zlib"; None usa LZ4 si está
+        instalado y zlib si no (default: None).
+    """
+    
+    name = "packed"
+    extension = ".cpk"
+    MAGIC = b"CPK1"
+    
+    def __init__(self, compressor: Optional[str] = None):
+        if compressor is None:
+            try:
+                import lz4.frame  # noqa: F401
+                compressor = "lz4"
+            except ImportError:
+                compressor = "zlib"
+        
+        if compressor not in ("lz4", "zlib"):
+            raise ValueError(f"[CHESS_CNN] Compresor desconocido: {compressor}")
+        self.compressor = compressor
+    
+    @staticmethod
+    def _lz4():
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImportError(
+                "[CHESS_CNN] lz4 no disponible. Instalar con: pip install lz4"
+            )
+        return lz4.frame
+    
+    def encode(self, array: np.ndarray) -> bytes:
+        array = np.ascontiguousarray(array)
+        dtype = array.dtype.str.encode()
+        header = (self.MAGIC + self.compressor[0].encode()
+                  + struct.pack("<B", len(dtype)) + dtype
+                  + struct.pack(f"<B{array.ndim}I", array.ndim, *array.shape))
+        
+        if self.compressor == "lz4":
+            payload = self._lz4().compress(array.data, compression_level=0)
+        else:
+            payload = zlib.compress(array.data, 1)
+        
+        return header + payload
+    
+    def decode(self, data: bytes) -> np.ndarray:
+        if data[:4] != self.MAGIC:
+            raise ValueError("[CHESS_CNN] No es un array empaquetado (CPK1)")
+        
+        compressor = data[4:5]
+        dtype_len = data[5]
+        dtype = np.dtype(data[6:6 + dtype_len].decode())
+        pos = 6 + dtype_len
+        ndim = data[pos]
+        shape = struct.unpack_from(f"<{ndim}I", data, pos + 1)
+        payload = memoryview(data)[pos + 1 + 4 * ndim:]
+        
+        if compressor == b"l":
+            raw = self._lz4().decompress(payload)
+        else:
+            raw = zlib.decompress(payload)
+        
+        return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+def make_codec(
+    name: str,
+    png_level: Optional[int] = None,
+    png_filter: Optional[str] = None,
+    png_strategy: Optional[str] = None,
+    channels: int = 3
+) -> Codec:
+    """Crea un códec de ``CODECS`` por nombre.
+    
+    Parameters
+    ----------
+    name : str
+        "png", "webp", "npy" o "packed".
+    png_level, png_filter, png_strategy : optional
+        Opciones de ``PngCodec`` (ignoradas por el resto).
+    channels : int, optional
+        Canales de las imágenes, para ``WebpCodec`` (default: 3).
+    
+    Returns
+    -------
+    Codec
+        Instancia del códec.
+    """
+    if name == "png":
+        return PngCodec(level=png_level, png_filter=png_filter, strategy=png_strategy)
+    if name == "webp":
+        return WebpCodec(channels=channels)
+    if name == "npy":
+        return NpyCodec()
+    if name == "packed":
+        return PackedCodec()
+    raise ValueError(f"[CHESS_CNN] Códec desconocido: {name} (opciones: {', '.join(CODECS)})")
+
+
+def codec_for_path(path: Path) -> Codec:
+    """Códec por defecto para la extensión de ``path``."""
+    for codec in (PngCodec(), WebpCodec(), NpyCodec(), PackedCodec()):
+        if path.suffix == codec.extension:
+            return codec
+    raise ValueError(f"[CHESS_CNN] Extensión sin códec: {path.suffix}")
+
+
+def write_array(path: Path, array: np.ndarray, codec: Optional[Codec] = None) -> None:
+    """Escribe una salida con ``codec`` (o el de su extensión).
+    
+    Parameters
+    ----------
+    path : Path
+        Ruta de destino.
+    array : np.ndarray
+        Imagen en orden de canales de OpenCV (BGR) o array arbitrario
+        para ``npy``/``packed``.
+    codec : Optional[Codec], optional
+        Códec a usar; None lo elige por la extensión (default: None).
+    """
+    if codec is None:
+        codec = codec_for_path(path)
+    codec.write(path, array)
+
+
+class ContentStore:
+    """Almacén de salidas deduplicado por contenido.
+    
+    Cada salida distinta se guarda una sola vez en
+    ``objects/<hh>/<hash><ext>``, donde ``hash`` es BLAKE2b-128 del array
+    crudo (dtype, shape y bytes) y ``ext`` la extensión del nombre lógico.
+    ``index.tsv`` asigna cada nombre lógico (``{jugador}_game{NN}.png``) a su
+    objeto, y sirve como tabla de etiquetas.
+    
+    El hash se calcula antes de codificar: una salida repetida (la misma
+    partida en varios archivos, aperturas idénticas con ventanas cortas)
+    solo añade una línea al índice, sin pasar por la compresión PNG. Los
+    duplicados se detectan por la existencia del objeto en disco, sin
+    cargar el índice.
+    
+    Parameters
+    ----------
+    root : Path
+        Directorio del almacén. Si ya contiene un almacén, se amplía.
+    codec : Optional[Codec], optional
+        Códec de los objetos; None lo elige por la extensión del nombre
+        lógico (default: None).
+    """
+    
+    INDEX_NAME = "index.tsv"
+    OBJECTS_DIR = "objects"
+    
+    def __init__(self, root: Path, codec: Optional[Codec] = None):
+        self.root = root
+        self.codec = codec
+        self.objects_dir = root / self.OBJECTS_DIR
+        self.index_path = root / self.INDEX_NAME
+        self.entries = 0
+        self.duplicates = 0
+        
+        root.mkdir(parents=True, exist_ok=True)
+        
+        new_index = not self.index_path.exists()
+        self._index = open(self.index_path, 'a', encoding='utf-8')
+        if new_index:
+            self._index.write("name\tobject\n")
     
-    try:
-        import cairosvg
-    except ImportError:
-        raise ImportError(
-            "[CHESS_CNN] cairosvg no disponible. Instalar con: pip install cairosvg"
-        )
+    @staticmethod
+    def array_hash(array: np.ndarray) -> str:
+        """Hash hexadecimal del contenido de un array (incluye dtype y shape)."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(np.ascontiguousarray(array).data)
+        return digest.hexdigest()
     
-    # Generar SVG sin coordenadas para máxima limpieza visual
-    svg_data = chess.svg.board(board=board, size=size, coordinates=False)
+    @classmethod
+    def object_path(cls, root: Path, object_name: str) -> Path:
+        """Ruta de un objeto (``<hash><ext>``) dentro del almacén ``root``."""
+        return root / cls.OBJECTS_DIR / object_name[:2] / object_name
     
-    # Convertir SVG a PNG en memoria
-    png_data = cairosvg.svg2png(bytestring=svg_data.encode('utf-8'))
+    @classmethod
+    def read_index(cls, root: Path) -> Dict[str, str]:
+        """Lee el índice nombre lógico → objeto (la última entrada gana).
+        
+        Parameters
+        ----------
+        root : Path
+            Directorio del almacén.
+        
+        Returns
+        -------
+        Dict[str, str]
+            Diccionario ``{nombre: "<hash><ext>"}``; vacío si no hay índice.
+        """
+        index = {}
+        try:
+            with open(root / cls.INDEX_NAME, encoding='utf-8') as f:
+                next(f, None)
+                for line in f:
+                    name, _, object_name = line.rstrip('\n').partition('\t')
+                    if object_name:
+                        index[name] = object_name
+        except FileNotFoundError:
+            pass
+        return index
     
-    # Decodificar PNG a array numpy
-    png_array = np.frombuffer(png_data, dtype=np.uint8)
-    img = cv2.imdecode(png_array, cv2.IMREAD_COLOR)
+    def write(self, path: Path, array: np.ndarray) -> None:
+        """Guarda ``array`` bajo el nombre lógico ``path.name``.
+        
+        Misma firma que ``write_array`` para usarse como destino de
+        ``BoundedWriter``. No es seguro llamarlo desde varios hilos a la vez.
+        """
+        object_name = self.array_hash(array) + path.suffix
+        object_path = self.object_path(self.root, object_name)
+        
+        # El propio almacén es el conjunto de objetos conocidos: no se
+        # mantiene en memoria, así que no crece con el número de salidas
+        if object_path.exists():
+            self.duplicates += 1
+        else:
+            # Escritura atómica: un objeto existente está siempre completo
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = object_path.with_name(f".{object_name}.tmp{path.suffix}")
+            write_array(tmp_path, array, self.codec)
+            os.replace(tmp_path, object_path)
+        
+        self._index.write(f"{path.name}\t{object_name}\n")
+        self.entries += 1
     
-    # Convertir BGR (OpenCV) a RGB (estándar)
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    def close(self) -> None:
+        if not self._index.closed:
+            self._index.close()
     
-    return img_rgb
+    def __enter__(self) -> "ContentStore":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
 
 
-def extract_board_sequence(
-    pgn_text: str,
-    start_move: int,
-    end_move: int
-) -> List[chess.Board]:
-    """Extrae secuencia de tableros desde PGN entre movimientos especificados.
+class BoundedWriter:
+    """Escritor en segundo plano con memoria pendiente acotada.
+    
+    ``submit`` encola la salida y retorna de inmediato mientras los bytes
+    pendientes de escribir no superen ``max_pending_bytes``; si se
+    superarían, bloquea hasta que el hilo escritor libere espacio
+    (backpressure), de forma que la cola nunca crece sin límite aunque el
+    disco sea más lento que el renderizado. Una salida mayor que el límite
+    se admite solo con la cola vacía.
+    
+    Los errores de escritura se cuentan en ``failed`` y se pasan a
+    ``on_error`` (o se informan por stderr si no se indica). Un error dentro
+    de ``on_error`` se informa por stderr y no detiene el hilo; si el hilo
+    muere de todos modos, ``submit`` lanza RuntimeError en lugar de
+    bloquearse.
     
     Parameters
     ----------
-    pgn_text : str
-        Texto completo del archivo PGN.
-    start_move : int
-        Número del movimiento inicial (más antiguo).
-    end_move : int
-        Número del movimiento final (más reciente).
-    
-    Returns
-    -------
-    List[chess.Board]
-        Lista de tableros ordenados del más antiguo al más reciente.
-        Posición 0 = movimiento start_move
-        Última posición = movimiento end_move
+    max_pending_bytes : int, optional
+        Techo de bytes encolados pendientes de escribir
+        (default: DEFAULT_MAX_MEMORY_MB MB).
+    on_error : Optional[Callable[[Path, Exception, Any], None]], optional
+        Se llama desde el hilo escritor con la ruta, el error y el
+        ``context`` dado a ``submit`` (default: None).
+    write : Callable[[Path, np.ndarray], None], optional
+        Función de escritura, llamada solo desde el hilo escritor
+        (default: ``write_array``; p. ej. ``ContentStore.write``).
     """
-    if start_move < 1 or end_move < start_move:
-        raise ValueError(
-            f"[CHESS_CNN] Rango de movimientos inválido: {start_move}-{end_move}"
-        )
     
-    # Parsear PGN
-    game = chess.pgn.read_game(StringIO(pgn_text))
-    if game is None:
-        raise ValueError("[CHESS_CNN] No se pudo parsear el PGN")
+    def __init__(
+        self,
+        max_pending_bytes: int = DEFAULT_MAX_MEMORY_MB * 2**20,
+        on_error: Optional[Callable[[Path, Exception, Any], None]] = None,
+        write: Callable[[Path, np.ndarray], None] = write_array
+    ):
+        if max_pending_bytes <= 0:
+            raise ValueError("[CHESS_CNN] max_pending_bytes debe ser positivo")
+        
+        self.max_pending_bytes = max_pending_bytes
+        self.on_error = on_error
+        self.write = write
+        self.failed = 0
+        self._pending_bytes = 0
+        self._queue = deque()
+        self._closed = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
     
-    # Extraer secuencia de tableros
-    boards = []
-    board = game.board()
-    move_num = 0
+    def submit(self, path: Path, array: np.ndarray, context: Any = None) -> None:
+        """Encola ``array`` para escribirse en ``path``.
+        
+        El llamante no debe modificar ``array`` después de encolarlo.
+        ``context`` se devuelve a ``on_error`` si la escritura falla.
+        """
+        nbytes = array.nbytes
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("[CHESS_CNN] BoundedWriter ya está cerrado")
+            
+            while True:
+                if self._stopped:
+                    raise RuntimeError("[CHESS_CNN] El hilo escritor de BoundedWriter terminó inesperadamente")
+                if not self._pending_bytes or self._pending_bytes + nbytes <= self.max_pending_bytes:
+                    break
+                self._cond.wait()
+            
+            self._queue.append((path, array, context))
+            self._pending_bytes += nbytes
+            self._cond.notify_all()
     
-    for node in game.mainline():
-        move_num += 1
-        board.push(node.move)
+    def close(self) -> int:
+        """Escribe todo lo pendiente y detiene el hilo escritor.
         
-        if start_move <= move_num <= end_move:
-            # Copiar tablero para evitar referencias mutables
-            boards.append(board.copy())
+        Returns
+        -------
+        int
+            Número de escrituras fallidas.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        return self.failed
     
-    if len(boards) < (end_move - start_move + 1):
-        raise ValueError(
-            f"[CHESS_CNN] La partida tiene solo {move_num} movimientos, "
-            f"pero se solicitaron movimientos {start_move}-{end_move}"
-        )
+    def __enter__(self) -> "BoundedWriter":
+        return self
     
-    return boards
+    def __exit__(self, *exc) -> None:
+        self.close()
+    
+    def _run(self) -> None:
+        try:
+            self._drain()
+        finally:
+            # Normal o no, nadie más vaciará la cola: despertar a submit
+            with self._cond:
+                self._stopped = True
+                self._cond.notify_all()
+    
+    def _drain(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # Sigue contando como pendiente hasta que esté en disco
+                path, array, context = self._queue[0]
+            
+            try:
+                self.write(path, array)
+            except Exception as e:
+                self.failed += 1
+                self._report_error(path, e, context)
+            finally:
+                with self._cond:
+                    self._queue.popleft()
+                    self._pending_bytes -= array.nbytes
+                    self._cond.notify_all()
+    
+    def _report_error(self, path: Path, error: Exception, context: Any) -> None:
+        if self.on_error is not None:
+            try:
+                self.on_error(path, error, context)
+                return
+            except Exception as e:
+                print(f"✗ on_error: {str(e)}", file=sys.stderr)
+        print(f"✗ {path.name}: {str(error)}", file=sys.stderr)
 
 
-def overlay_temporal_sequence(
-    board_sequence: List[chess.Board],
-    compression_factor: int = 2,
-    board_size: int = 400,
-    min_intensity: float = 0.3,
-    max_intensity: float = 1.0
-) -> np.ndarray:
-    """Superpone secuencia de tableros con intensidad temporal decreciente.
+def iter_encoded_games(
+    pgn_path: Path,
+    start_move: int,
+    end_move: int,
+    compression_factor: Union[int, Sequence[int]],
+    player_moves_only: bool = False,
+    encoding: str = "overlay",
+    color_mode: str = "rgb",
+    reject_log: Optional[RejectLog] = None,
+    corpus: Optional[MoveCorpus] = None,
+    heatmap_upsample: bool = False
+) -> Iterator[Tuple[int, int, Union[np.ndarray, Dict[int, np.ndarray]]]]:
+    """Codifica las partidas de un archivo PGN una a una, sin escribirlas.
     
-    Los tableros se superponen con transparencia basada en antigüedad:
-    - Movimiento más reciente (última posición): intensidad máxima (brillante)
-    - Movimiento más antiguo (primera posición): intensidad mínima (oscuro)
+    Cada partida se clasifica antes de parsearla (``precheck_pgn_game``) y
+    tras parsearla (jugadas ilegales); los descartes se registran en
+    ``reject_log`` por motivo, sin mensajes por partida.
+    
+    El archivo se lee partida a partida y cada ventana se renderiza en
+    streaming (``iter_board_sequence`` + ``overlay_temporal_stream``), así
+    que la memoria no crece con el tamaño del archivo ni de la ventana.
     
     Parameters
     ----------
-    board_sequence : List[chess.Board]
-        Secuencia de tableros ordenados del más antiguo al más reciente.
-    compression_factor : int, optional
-        Factor de reducción de tamaño (default: 2).
-        1 = sin compresión, 2 = mitad de tamaño, 4 = cuarto de tamaño, etc.
-    board_size : int, optional
-        Tamaño del tablero antes de compresión (default: 400).
-    min_intensity : float, optional
-        Intensidad mínima para movimientos antiguos (default: 0.3).
-    max_intensity : float, optional
-        Intensidad máxima para movimientos recientes (default: 1.0).
+    pgn_path : Path
+        Ruta al archivo PGN.
+    start_move, end_move, compression_factor, player_moves_only, encoding, color_mode, heatmap_upsample
+        Como en ``process_pgn_file``.
+    reject_log : Optional[RejectLog], optional
+        Registro de partidas descartadas (default: None).
+    corpus : Optional[MoveCorpus], optional
+        Leer las partidas de ``pgn_path`` desde este corpus en lugar del
+        texto PGN; si el corpus tiene ``PositionTable``, las ventanas se
+        leen de ella (default: None).
     
-    Returns
-    -------
-    np.ndarray
-        Imagen RGB con superposición temporal.
-        Shape: (height, width, 3), dtype: uint8
+    Yields
+    ------
+    Tuple[int, int, Union[np.ndarray, Dict[int, np.ndarray]]]
+        ``(número de partida, offset en bytes, array)``. Las imágenes de
+        ``overlay`` salen en BGR, el orden nativo de OpenCV. Con una
+        secuencia de factores, ``array`` es un diccionario ``{factor: array}``
+        generado con un solo renderizado por posición.
     """
-    if not board_sequence:
-        raise ValueError("[CHESS_CNN] board_sequence no puede estar vacía")
+    player_name = pgn_path.stem  # Nombre del archivo sin extensión
+    window_size = end_move - start_move + 1
     
-    if compression_factor < 1:
-        raise ValueError("[CHESS_CNN] compression_factor debe ser >= 1")
+    factors, multi = _as_factors(compression_factor)
     
-    if not (0.0 <= min_intensity <= max_intensity <= 1.0):
-        raise ValueError(
-            "[CHESS_CNN] Intensidades deben cumplir: 0 <= min <= max <= 1"
-        )
+    if reject_log is None:
+        reject_log = RejectLog()
     
-    num_boards = len(board_sequence)
+    if corpus is not None:
+        games = _iter_corpus_games(corpus, pgn_path, end_move, player_moves_only, reject_log)
+    else:
+        games = _iter_pgn_file_games(pgn_path, end_move, player_moves_only, reject_log)
     
-    # Calcular tamaño comprimido
-    compressed_size = board_size // compression_factor
+    # Con tabla de posiciones la ventana es un slice: no se reproducen jugadas
+    positions = corpus.positions if corpus is not None else None
     
-    # Inicializar imagen acumulada (float para precisión)
-    accumulated = np.zeros((compressed_size, compressed_size, 3), dtype=np.float32)
+    for game_num, offset, game, player_color in games:
+        try:
+            rows = None
+            if positions is not None:
+                rows = positions.window_rows(game.row, start_move, end_move, player_color)
+            
+            if encoding == "heatmap":
+                # Mapa de calor de jugadas, sin renderizar tableros
+                if rows is not None:
+                    moves = positions.move_array(rows)
+                else:
+                    moves = _window_move_array(
+                        game,
+                        start_move,
+                        end_move,
+                        player_color=player_color
+                    )
+                grid = move_heatmap_sequence(
+                    moves,
+                    min_intensity=0.3,
+                    max_intensity=1.0,
+                    upsample=False
+                )
+                if heatmap_upsample:
+                    imgs = {factor: upsample_heatmap(grid, factor) for factor in factors}
+                else:
+                    # La rejilla 8x8 no depende del factor
+                    imgs = {factor: grid for factor in factors}
+            else:
+                # Generar imagen con superposición temporal en streaming
+                # (en BGR, el orden nativo de OpenCV: sin conversiones)
+                if rows is not None:
+                    boards = positions.iter_boards(rows)
+                else:
+                    boards = iter_board_sequence(
+                        game,
+                        start_move,
+                        end_move,
+                        player_color=player_color
+                    )
+                imgs = overlay_temporal_pyramid(
+                    boards,
+                    window_size,
+                    factors,
+                    min_intensity=0.3,
+                    max_intensity=1.0,
+                    color_mode=color_mode,
+                    channel_order="bgr"
+                )
+        
+        except Exception as e:
+            # Fallo inesperado: se registra y se informa
+            reject_log.record(pgn_path, offset, game_num, "render_failure", str(e))
+            print(f"✗ {player_name} game {game_num}: {str(e)}", file=sys.stderr)
+            continue
+        
+        yield game_num, offset, imgs if multi else imgs[factors[0]]
+
+
+def _iter_pgn_file_games(
+    pgn_path: Path,
+    end_move: int,
+    player_moves_only: bool,
+    reject_log: RejectLog
+) -> Iterator[Tuple[int, int, chess.pgn.Game, Optional[chess.Color]]]:
+    """Partidas válidas de un archivo PGN: ``(número, offset, partida, color)``."""
+    player_name = pgn_path.stem  # Nombre del archivo sin extensión
     
-    # Procesar cada tablero en orden (antiguo → reciente)
-    for i, board in enumerate(board_sequence):
-        # Renderizar tablero a PNG
-        img_rgb = board_to_png_array(board, size=board_size)
-        
-        # Aplicar compresión si es necesario
-        if compression_factor > 1:
-            img_rgb = cv2.resize(
-                img_rgb,
-                (compressed_size, compressed_size),
-                interpolation=cv2.INTER_AREA
-            )
+    game_num = 0
+    for offset, pgn_text in iter_pgn_games(pgn_path):
+        game_num += 1
         
-        # Calcular intensidad temporal
-        # i=0 (antiguo) → min_intensity
-        # i=num_boards-1 (reciente) → max_intensity
-        if num_boards > 1:
-            progress = i / (num_boards - 1)
-        else:
-            progress = 1.0
+        # Descartes esperados: clasificar sin parsear ni lanzar excepciones
+        reason, detail, player_color = precheck_pgn_game(
+            pgn_text, player_name, end_move, player_moves_only
+        )
         
-        intensity = min_intensity + (max_intensity - min_intensity) * progress
+        if reason is None:
+            game = chess.pgn.read_game(StringIO(pgn_text), Visitor=_QuietGameBuilder)
+            reason, detail = _parse_error(game)
+            if reason is None:
+                # Red de seguridad del conteo rápido de jugadas
+                available = count_player_moves(game, player_color)
+                if available < end_move:
+                    reason = "too_short"
+                    detail = f"{available} < {end_move}"
+        
+        if reason is not None:
+            reject_log.record(pgn_path, offset, game_num, reason, detail)
+            continue
         
-        # Aplicar intensidad y acumular
-        img_weighted = img_rgb.astype(np.float32) * intensity
-        accumulated = np.maximum(accumulated, img_weighted)
+        yield game_num, offset, game, player_color
+
+
+def _iter_corpus_games(
+    corpus: MoveCorpus,
+    pgn_path: Path,
+    end_move: int,
+    player_moves_only: bool,
+    reject_log: RejectLog
+) -> Iterator[Tuple[int, int, CorpusGame, Optional[chess.Color]]]:
+    """Como ``_iter_pgn_file_games`` pero desde un ``MoveCorpus``.
+    
+    Aplica los filtros en el mismo orden que sobre el texto PGN, así que
+    los descartes coinciden.
+    """
+    player_name = pgn_path.stem
     
-    # Convertir de vuelta a uint8
-    result = np.clip(accumulated, 0, 255).astype(np.uint8)
+    for row in corpus.file_rows(pgn_path):
+        record = corpus.games[row]
+        entry = corpus.entry(row)
+        stored = REJECT_REASONS[record["reject"] - 1] if record["reject"] else None
+        player_color = None
+        
+        if stored is not None and not record["parsed"]:
+            # Descartado antes de parsear (cabeceras mal formadas)
+            reason, detail = stored, entry.get("detail", "")
+        else:
+            reason, detail, player_color = _precheck_window(
+                entry["headers"], int(record["text_plies"]), player_name,
+                end_move, player_moves_only
+            )
+            if reason is None and stored is not None:
+                reason, detail = stored, entry.get("detail", "")
+        
+        if reason is None:
+            game = corpus.game(row, entry["headers"])
+            available = count_player_moves(game, player_color)
+            if available < end_move:
+                reason = "too_short"
+                detail = f"{available} < {end_move}"
+        
+        if reason is not None:
+            reject_log.record(pgn_path, int(record["offset"]), int(record["game"]), reason, detail)
+            continue
+        
+        yield game.game_num, game.offset, game, player_color
+
+
+def _as_factors(compression_factor: Union[int, Sequence[int]]) -> Tuple[Tuple[int, ...], bool]:
+    """Normaliza ``compression_factor`` a ``(factores, multirresolución)``.
     
-    return result
+    Un entero (``int``, ``np.int64``...) da un solo factor y ``False``; una
+    secuencia da sus factores y ``True``, aunque tenga un solo elemento.
+    """
+    if isinstance(compression_factor, numbers.Integral):
+        return (operator.index(compression_factor),), False
+    return tuple(operator.index(factor) for factor in compression_factor), True
+
+
+def resolution_dir(output_dir: Path, compression_factor: int) -> Path:
+    """Árbol de salida de un factor en modo multirresolución (``x{factor}``)."""
+    return output_dir / f"x{compression_factor}"
+
+
+def default_codec(encoding: str, color_mode: str = "rgb") -> Codec:
+    """Códec por defecto de una codificación: PNG para ``overlay``, npy para ``heatmap``."""
+    if encoding == "heatmap":
+        return NpyCodec()
+    return make_codec("png", channels=1 if color_mode in ("gray", "palette") else 3)
 
 
 def process_pgn_file(
@@ -210,10 +2483,26 @@ def process_pgn_file(
     output_dir: Path,
     start_move: int,
     end_move: int,
-    compression_factor: int
+    compression_factor: Union[int, Sequence[int]],
+    player_moves_only: bool = False,
+    encoding: str = "overlay",
+    color_mode: str = "rgb",
+    max_memory_mb: int = DEFAULT_MAX_MEMORY_MB,
+    reject_log: Optional[RejectLog] = None,
+    store: Optional[Union[ContentStore, Mapping[int, ContentStore]]] = None,
+    codec: Optional[Codec] = None,
+    corpus: Optional[MoveCorpus] = None,
+    heatmap_upsample: bool = False
 ) -> int:
     """Procesa un archivo PGN completo y genera imágenes para cada partida.
     
+    Las partidas se codifican con ``iter_encoded_games`` y se escriben en
+    segundo plano a través de un ``BoundedWriter``.
+    
+    Con varios factores de compresión cada posición se renderiza una vez y
+    cada resolución se escribe en su propio árbol,
+    ``resolution_dir(output_dir, factor)``, con los mismos nombres de archivo.
+    
     Parameters
     ----------
     pgn_path : Path
@@ -224,66 +2513,119 @@ def process_pgn_file(
         Movimiento inicial.
     end_move : int
         Movimiento final.
-    compression_factor : int
-        Factor de compresión.
+    compression_factor : Union[int, Sequence[int]]
+        Factor de compresión, o lista de factores para generar todas las
+        resoluciones en una pasada.
+    player_moves_only : bool, optional
+        Codificar solo las jugadas del jugador del archivo (color resuelto
+        desde las cabeceras). La ventana cuenta jugadas del jugador
+        (default: False).
+    encoding : str, optional
+        Codificación de cada partida (ver ``ENCODINGS``): ``"overlay"``
+        genera una imagen con superposición temporal, ``"heatmap"`` el mapa
+        de calor de jugadas (9 canales) (default: "overlay").
+    color_mode : str, optional
+        Modo de color de la superposición (ver ``COLOR_MODES``): "rgb",
+        "gray" (1 canal) o "palette" (índices; la paleta se guarda en
+        ``palette.npy``) (default: "rgb").
+    max_memory_mb : int, optional
+        Techo de memoria (MB) para salidas pendientes de escribir; al
+        alcanzarlo el procesamiento espera al disco
+        (default: DEFAULT_MAX_MEMORY_MB).
+    reject_log : Optional[RejectLog], optional
+        Registro de partidas descartadas; si es None solo se cuentan
+        internamente (default: None).
+    store : Optional[Union[ContentStore, Mapping[int, ContentStore]]], optional
+        Almacén deduplicado donde guardar las salidas en lugar de un archivo
+        por partida en ``output_dir``; con varios factores, un almacén por
+        factor (default: None).
+    codec : Optional[Codec], optional
+        Códec de salida; su extensión da nombre a los archivos. None usa
+        ``default_codec(encoding, color_mode)`` (default: None).
+    corpus : Optional[MoveCorpus], optional
+        Leer las partidas desde este corpus (``pgn_path`` tal como se
+        indexó) en lugar del texto PGN (default: None).
+    heatmap_upsample : bool, optional
+        Escalar el mapa de calor al tamaño comprimido del tablero; por
+        defecto se guarda la rejilla 8x8, que contiene la misma
+        información (default: False).
     
     Returns
     -------
     int
         Número de partidas procesadas exitosamente.
     """
-    output_dir.mkdir(parents=True, exist_ok=True)
+    factors, multi = _as_factors(compression_factor)
+    
+    if multi:
+        output_dirs = {factor: resolution_dir(output_dir, factor) for factor in factors}
+    else:
+        output_dirs = {factors[0]: output_dir}
+    
+    for factor_dir in output_dirs.values():
+        factor_dir.mkdir(parents=True, exist_ok=True)
+        
+        if encoding == "overlay" and color_mode == "palette":
+            np.save(factor_dir / "palette.npy", palette_lut()[1])
+    
+    if codec is None:
+        codec = default_codec(encoding, color_mode)
     
     player_name = pgn_path.stem  # Nombre del archivo sin extensión
     games_processed = 0
     
-    with open(pgn_path, encoding='utf-8') as pgn_file:
-        game_num = 0
-        while True:
-            game = chess.pgn.read_game(pgn_file)
-            if game is None:
-                break
+    if reject_log is None:
+        reject_log = RejectLog()
+    
+    # Partidas con alguna escritura fallida (una partida puede tener varias
+    # salidas, una por resolución)
+    failed_games = set()
+    
+    def on_write_error(path: Path, error: Exception, context: Any) -> None:
+        if context[1] not in failed_games:
+            failed_games.add(context[1])
+            reject_log.record(pgn_path, context[0], context[1], "write_failure", str(error))
+    
+    if isinstance(store, ContentStore):
+        write = store.write
+    elif store is not None:
+        # Un almacén por factor, elegido por el directorio de destino
+        stores_by_dir = {output_dirs[factor]: factor_store for factor, factor_store in store.items()}
+        
+        def write(path: Path, array: np.ndarray) -> None:
+            stores_by_dir[path.parent].write(path, array)
+    else:
+        def write(path: Path, array: np.ndarray) -> None:
+            write_array(path, array, codec)
+    
+    games = iter_encoded_games(
+        pgn_path,
+        start_move,
+        end_move,
+        compression_factor,
+        player_moves_only=player_moves_only,
+        encoding=encoding,
+        color_mode=color_mode,
+        reject_log=reject_log,
+        corpus=corpus,
+        heatmap_upsample=heatmap_upsample
+    )
+    
+    with BoundedWriter(max_memory_mb * 2**20, on_error=on_write_error, write=write) as writer:
+        for game_num, offset, img in games:
+            output_filename = f"{player_name}_game{game_num:02d}{codec.extension}"
+            imgs = img if multi else {factors[0]: img}
             
-            game_num += 1
+            # Guardar imagen (una por resolución)
+            for factor, factor_img in imgs.items():
+                writer.submit(output_dirs[factor] / output_filename, factor_img, context=(offset, game_num))
             
-            try:
-                # Convertir game a string PGN
-                exporter = chess.pgn.StringExporter(
-                    headers=True, 
-                    variations=False, 
-                    comments=False
-                )
-                pgn_text = game.accept(exporter)
-                
-                # Extraer secuencia de tableros
-                board_sequence = extract_board_sequence(
-                    pgn_text, 
-                    start_move, 
-                    end_move
-                )
-                
-                # Generar imagen con superposición temporal
-                img = overlay_temporal_sequence(
-                    board_sequence,
-                    compression_factor=compression_factor,
-                    min_intensity=0.3,
-                    max_intensity=1.0
-                )
-                
-                # Guardar imagen
-                output_filename = f"{player_name}_game{game_num:02d}.png"
-                output_path = output_dir / output_filename
-                
-                # Convertir RGB a BGR para OpenCV
-                img_bgr = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-                cv2.imwrite(str(output_path), img_bgr)
-                
-                games_processed += 1
-                print(f"✓ {output_filename} ({img.shape[0]}x{img.shape[1]})")
-                
-            except Exception as e:
-                print(f"✗ {player_name} game {game_num}: {str(e)}", file=sys.stderr)
-                continue
+            games_processed += 1
+            sizes = ", ".join(f"{a.shape[0]}x{a.shape[1]}" for a in imgs.values())
+            print(f"✓ {output_filename} ({sizes})")
+    
+    # Las escrituras fallidas en segundo plano no cuentan como procesadas
+    games_processed -= len(failed_games)
     
     return games_processed
 
@@ -293,7 +2635,18 @@ def main(
     output_dir: Path,
     start_move: int,
     end_move: int,
-    compression_factor: int
+    compression_factor: Union[int, Sequence[int]],
+    player_moves_only: bool = False,
+    encoding: str = "overlay",
+    color_mode: str = "rgb",
+    max_memory_mb: int = DEFAULT_MAX_MEMORY_MB,
+    output_backend: str = "files",
+    codec: Optional[str] = None,
+    png_level: Optional[int] = None,
+    png_filter: Optional[str] = None,
+    png_strategy: Optional[str] = None,
+    corpus_dir: Optional[Path] = None,
+    heatmap_upsample: bool = False
 ):
     """Función principal que procesa todos los archivos PGN.
     
@@ -307,59 +2660,177 @@ def main(
         Movimiento inicial
     end_move : int
         Movimiento final
-    compression_factor : int
-        Factor de compresión
+    compression_factor : Union[int, Sequence[int]]
+        Factor de compresión, o lista de factores: cada posición se renderiza
+        una vez y cada resolución va a ``output_dir/x{factor}/``
+    player_moves_only : bool, optional
+        Codificar solo las jugadas del jugador de cada archivo (default: False)
+    encoding : str, optional
+        Codificación de cada partida, "overlay" o "heatmap" (default: "overlay")
+    color_mode : str, optional
+        Modo de color de la superposición: "rgb", "gray" o "palette" (default: "rgb")
+    max_memory_mb : int, optional
+        Techo de memoria (MB) para salidas pendientes de escribir (default: 256)
+    output_backend : str, optional
+        "files" (un archivo por partida) o "dedup" (``ContentStore`` en
+        ``output_dir``: objetos únicos + ``index.tsv``) (default: "files")
+    codec : Optional[str], optional
+        Códec de salida (ver ``CODECS``); None usa png para "overlay" y npy
+        para "heatmap" (default: None)
+    png_level, png_filter, png_strategy : optional
+        Ajustes del códec png (ver ``PngCodec``) (default: None)
+    corpus_dir : Optional[Path], optional
+        Leer las partidas de un ``MoveCorpus`` (ver ``build_move_corpus``)
+        en lugar de ``pgn_dir`` (default: None)
+    heatmap_upsample : bool, optional
+        Guardar el mapa de calor escalado al tamaño comprimido en lugar de
+        la rejilla 8x8 (default: False)
+    
+    Las partidas descartadas se registran en ``output_dir/rejects.tsv``.
     """
     # Validar parámetros
-    if not pgn_dir.exists():
+    if corpus_dir is None and not pgn_dir.exists():
         raise ValueError(f"Directorio PGN no existe: {pgn_dir}, ruta global: {pgn_dir.resolve()}")
     
     if start_move < 1 or end_move < start_move:
         raise ValueError(f"Rango de movimientos inválido: {start_move}-{end_move}")
     
-    if compression_factor < 1:
-        raise ValueError(f"Factor de compresión debe ser >= 1: {compression_factor}")
+    factors, multi = _as_factors(compression_factor)
+    factors = list(dict.fromkeys(factors))
+    if not factors:
+        raise ValueError("Se necesita al menos un factor de compresión")
+    
+    # Un solo factor, aunque venga en lista, escribe directamente en output_dir
+    multi = len(factors) > 1
+    compression_factor = factors if multi else factors[0]
+    
+    if min(factors) < 1:
+        raise ValueError(f"Factor de compresión debe ser >= 1: {min(factors)}")
+    
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Codificación desconocida: {encoding} (opciones: {', '.join(ENCODINGS)})")
+    
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"Modo de color desconocido: {color_mode} (opciones: {', '.join(COLOR_MODES)})")
     
-    # Obtener todos los archivos .pgn
-    pgn_files = sorted(pgn_dir.glob("*.pgn"))
+    if max_memory_mb < 1:
+        raise ValueError(f"Techo de memoria debe ser >= 1 MB: {max_memory_mb}")
+    
+    if output_backend not in OUTPUT_BACKENDS:
+        raise ValueError(f"Backend de salida desconocido: {output_backend} (opciones: {', '.join(OUTPUT_BACKENDS)})")
+    
+    if codec is None:
+        codec = "npy" if encoding == "heatmap" else "png"
+    
+    if encoding == "heatmap" and codec in ("png", "webp"):
+        raise ValueError(f"El mapa de calor tiene {len(HEATMAP_CHANNELS)} canales: usar --codec npy o packed")
+    
+    output_codec = make_codec(
+        codec,
+        png_level=png_level,
+        png_filter=png_filter,
+        png_strategy=png_strategy,
+        channels=1 if color_mode in ("gray", "palette") else 3
+    )
+    
+    # Obtener todos los archivos .pgn (o los del corpus)
+    if corpus_dir is not None:
+        corpus = MoveCorpus(corpus_dir)
+        pgn_files = [Path(name) for name in corpus.files]
+    else:
+        corpus = None
+        pgn_files = sorted(pgn_dir.glob("*.pgn"))
     
     if not pgn_files:
-        raise ValueError(f"No se encontraron archivos .pgn en: {pgn_dir}")
+        raise ValueError(f"No se encontraron archivos .pgn en: {corpus_dir or pgn_dir}")
     
     print(f"\n{'='*70}")
     print(f"PROCESANDO PARTIDAS DE AJEDREZ")
     print(f"{'='*70}")
-    print(f"Directorio PGN: {pgn_dir}")
+    if corpus is not None:
+        print(f"Corpus de jugadas: {corpus_dir}")
+    else:
+        print(f"Directorio PGN: {pgn_dir}")
     print(f"Directorio salida: {output_dir}")
     print(f"Rango de movimientos: {start_move}-{end_move}")
-    print(f"Factor de compresión: {compression_factor}x")
+    print(f"Factor de compresión: {', '.join(f'{factor}x' for factor in factors)}")
+    print(f"Solo jugadas del jugador: {'sí' if player_moves_only else 'no'}")
+    print(f"Codificación: {encoding}")
+    if encoding == "overlay":
+        print(f"Modo de color: {color_mode}")
+    print(f"Techo de memoria de escritura: {max_memory_mb} MB")
+    print(f"Backend de salida: {output_backend}")
+    print(f"Códec: {codec}")
     print(f"Archivos PGN encontrados: {len(pgn_files)}")
     print(f"{'='*70}\n")
     
     total_games = 0
     
-    for pgn_path in pgn_files:
-        print(f"\n📁 Procesando: {pgn_path.name}")
-        print(f"   {'-'*66}")
-        
-        games_count = process_pgn_file(
-            pgn_path,
-            output_dir,
-            start_move,
-            end_move,
-            compression_factor
-        )
-        
-        total_games += games_count
-        print(f"   {'-'*66}")
-        print(f"   Partidas procesadas: {games_count}")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rejects_path = output_dir / "rejects.tsv"
+    
+    if output_backend != "dedup":
+        store = None
+    elif not multi:
+        store = ContentStore(output_dir, codec=output_codec)
+    else:
+        store = {
+            factor: ContentStore(resolution_dir(output_dir, factor), codec=output_codec)
+            for factor in factors
+        }
+    
+    with RejectLog(rejects_path) as reject_log:
+        for pgn_path in pgn_files:
+            print(f"\n📁 Procesando: {pgn_path.name}")
+            print(f"   {'-'*66}")
+            
+            rejected_before = reject_log.total()
+            games_count = process_pgn_file(
+                pgn_path,
+                output_dir,
+                start_move,
+                end_move,
+                compression_factor,
+                player_moves_only=player_moves_only,
+                encoding=encoding,
+                color_mode=color_mode,
+                max_memory_mb=max_memory_mb,
+                reject_log=reject_log,
+                store=store,
+                codec=output_codec,
+                corpus=corpus,
+                heatmap_upsample=heatmap_upsample
+            )
+            
+            total_games += games_count
+            print(f"   {'-'*66}")
+            print(f"   Partidas procesadas: {games_count}")
+            print(f"   Partidas descartadas: {reject_log.total() - rejected_before}")
+    
+    if corpus is not None:
+        corpus.close()
     
     print(f"\n{'='*70}")
     print(f"RESUMEN FINAL")
     print(f"{'='*70}")
     print(f"Total de archivos PGN: {len(pgn_files)}")
     print(f"Total de partidas procesadas: {total_games}")
-    print(f"Imágenes generadas en: {output_dir}")
+    print(f"Total de partidas descartadas: {reject_log.total()}")
+    for reason in REJECT_REASONS:
+        if reject_log.counts[reason]:
+            print(f"  - {reason}: {reject_log.counts[reason]}")
+    print(f"Descartes detallados en: {rejects_path}")
+    if store is not None:
+        stores = [store] if isinstance(store, ContentStore) else list(store.values())
+        for factor_store in stores:
+            factor_store.close()
+        print(f"Objetos únicos escritos: {sum(st.entries - st.duplicates for st in stores)}")
+        print(f"Salidas duplicadas (sin reescribir): {sum(st.duplicates for st in stores)}")
+        print(f"Índice nombre → objeto: {', '.join(str(st.index_path) for st in stores)}")
+    if not multi:
+        print(f"Imágenes generadas en: {output_dir}")
+    else:
+        print(f"Imágenes generadas en: {', '.join(str(resolution_dir(output_dir, f)) for f in factors)}")
     print(f"{'='*70}\n")
 
 
@@ -385,33 +2856,161 @@ if __name__ == "__main__":
     parser.add_argument(
         "--start-move",
         type=int,
-        required=True,
-        help="Movimiento inicial (más antiguo)"
+        help="Movimiento inicial (más antiguo); obligatorio salvo con --build-corpus"
     )
     
     parser.add_argument(
         "--end-move",
         type=int,
-        required=True,
-        help="Movimiento final (más reciente)"
+        help="Movimiento final (más reciente); obligatorio salvo con --build-corpus"
     )
     
     parser.add_argument(
         "--compression-factor",
         type=int,
-        default=2,
-        help="Factor de compresión (1=sin compresión, 2=mitad, 4=cuarto, etc.)"
+        nargs="+",
+        default=[2],
+        help="Factor de compresión (1=sin compresión, 2=mitad, 4=cuarto, etc.). "
+             "Varios factores (p. ej. 1 2 4) se generan en una pasada, cada uno en output-dir/x{factor}/"
+    )
+    
+    parser.add_argument(
+        "--player-moves-only",
+        action="store_true",
+        help="Codificar solo las jugadas del jugador del archivo (ventana en jugadas del jugador)"
+    )
+    
+    parser.add_argument(
+        "--encoding",
+        choices=ENCODINGS,
+        default="overlay",
+        help="Codificación: overlay (PNG renderizado) o heatmap (mapa de calor de jugadas .npy)"
+    )
+    
+    parser.add_argument(
+        "--heatmap-upsample",
+        action="store_true",
+        help="Guardar el mapa de calor escalado al tamaño comprimido en lugar de la rejilla 8x8"
+    )
+    
+    parser.add_argument(
+        "--color-mode",
+        choices=COLOR_MODES,
+        default="rgb",
+        help="Modo de color de la superposición: rgb, gray (1 canal) o palette (índices + palette.npy)"
+    )
+    
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        default=DEFAULT_MAX_MEMORY_MB,
+        help=f"Techo de memoria (MB) para salidas pendientes de escribir (default: {DEFAULT_MAX_MEMORY_MB})"
+    )
+    
+    parser.add_argument(
+        "--output-backend",
+        choices=OUTPUT_BACKENDS,
+        default="files",
+        help="files (un archivo por partida) o dedup (objetos únicos por hash + index.tsv)"
+    )
+    
+    parser.add_argument(
+        "--codec",
+        choices=CODECS,
+        default=None,
+        help="Códec de salida: png, webp (sin pérdidas), npy o packed (LZ4/zlib) (default: png para overlay, npy para heatmap)"
+    )
+    
+    parser.add_argument(
+        "--png-level",
+        type=int,
+        default=None,
+        help="Nivel de compresión PNG 0-9 (default: el de OpenCV)"
+    )
+    
+    parser.add_argument(
+        "--png-filter",
+        choices=tuple(PngCodec.FILTERS),
+        default=None,
+        help="Filtro PNG (requiere OpenCV >= 4.11)"
+    )
+    
+    parser.add_argument(
+        "--png-strategy",
+        choices=tuple(PngCodec.STRATEGIES),
+        default=None,
+        help="Estrategia zlib del PNG; rle es la más rápida en tableros"
+    )
+    
+    parser.add_argument(
+        "--build-corpus",
+        type=Path,
+        default=None,
+        help="Convertir --pgn-dir en un corpus binario de jugadas en este directorio y salir"
+    )
+    
+    parser.add_argument(
+        "--corpus",
+        type=Path,
+        default=None,
+        help="Leer las partidas de un corpus generado con --build-corpus en lugar de --pgn-dir"
+    )
+    
+    parser.add_argument(
+        "--build-positions",
+        action="store_true",
+        help="Generar la tabla de posiciones del corpus (--build-corpus o --corpus) y salir"
     )
     
     args = parser.parse_args()
     
+    if args.build_positions and args.build_corpus is None and args.corpus is None:
+        parser.error("--build-positions requiere --build-corpus o --corpus")
+    
+    if args.build_corpus is not None or args.build_positions:
+        try:
+            corpus_dir = args.corpus
+            if args.build_corpus is not None:
+                pgn_files = sorted(args.pgn_dir.glob("*.pgn"))
+                if not pgn_files:
+                    raise ValueError(f"No se encontraron archivos .pgn en: {args.pgn_dir}")
+                
+                games, rejected = build_move_corpus(pgn_files, args.build_corpus)
+                print(f"Corpus generado en: {args.build_corpus} "
+                      f"({games} partidas, {rejected} descartadas)")
+                corpus_dir = args.build_corpus
+            
+            if args.build_positions:
+                with MoveCorpus(corpus_dir) as corpus:
+                    positions = build_position_table(corpus)
+                print(f"Tabla de posiciones generada en: {corpus_dir / PositionTable.DIR_NAME} "
+                      f"({positions} posiciones)")
+        except Exception as e:
+            print(f"\n❌ ERROR: {str(e)}\n", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+    
+    if args.start_move is None or args.end_move is None:
+        parser.error("--start-move y --end-move son obligatorios")
+    
     try:
         main(
             pgn_dir=args.pgn_dir,
             output_dir=args.output_dir,
             start_move=args.start_move,
             end_move=args.end_move,
-            compression_factor=args.compression_factor
+            compression_factor=args.compression_factor,
+            player_moves_only=args.player_moves_only,
+            encoding=args.encoding,
+            color_mode=args.color_mode,
+            max_memory_mb=args.max_memory_mb,
+            output_backend=args.output_backend,
+            codec=args.codec,
+            png_level=args.png_level,
+            png_filter=args.png_filter,
+            png_strategy=args.png_strategy,
+            corpus_dir=args.corpus,
+            heatmap_upsample=args.heatmap_upsample
         )
     except Exception as e:
         print(f"\n❌ ERROR: {str(e)}\n", file=sys.stderr)
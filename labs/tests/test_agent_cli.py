@@ -0,0 +1,70 @@
+"""Tests del escaneo del repositorio de agent_cli.py."""
+
+import os
+
+from agent_cli import AgentCLI, IgnoreRule
+
+
+def _matches(pattern, rel_path, is_dir=False, base=''):
+    return IgnoreRule.parse(pattern, base).matches(rel_path, is_dir)
+
+
+def _touch_later(path):
+    """Adelanta el mtime para no depender de la resolución del reloj."""
+    mtime = path.stat().st_mtime_ns + 10**9
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_anchored_wildcards_do_not_cross_slashes():
+    """En patrones anclados ``*`` no cruza ``/`` y ``**`` abarca 0 o más directorios."""
+    assert _matches("labs/*.png", "labs/x.png")
+    assert not _matches("labs/*.png", "labs/output/left/x.png")
+    assert _matches("docs/**/tmp", "docs/tmp", is_dir=True)
+    assert _matches("docs/**/tmp", "docs/a/b/tmp", is_dir=True)
+    assert not _matches("docs/**/tmp", "docs/a/tmpx", is_dir=True)
+    assert _matches("**/build", "build", is_dir=True)
+    assert _matches("**/build", "a/b/build", is_dir=True)
+    assert _matches("out/**", "out/a/b.txt")
+    assert not _matches("out/**", "out", is_dir=True)
+    assert _matches("*.png", "labs/output/left/x.png")
+    assert _matches("/x.png", "sub/x.png", base="sub")
+    assert not _matches("/x.png", "sub/deep/x.png", base="sub")
+
+
+def test_changed_gitignore_triggers_full_rescan(tmp_path):
+    """Si cambia un .gitignore no se reutilizan listados con reglas viejas."""
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "keep.py").write_text("")
+    (tmp_path / "pkg" / "drop.py").write_text("")
+    gitignore = tmp_path / ".gitignore"
+    gitignore.write_text("*.tmp\n")
+
+    cli = AgentCLI(repo_root=str(tmp_path))
+    first = cli.generate_repo_context()
+    assert os.path.join("pkg", "drop.py") in first["metadata"]["python_files"]
+
+    gitignore.write_text("pkg/drop.py\n")
+    _touch_later(gitignore)
+    second = cli.generate_repo_context(first)
+
+    assert second["metadata"]["python_files"] == [os.path.join("pkg", "keep.py")]
+    assert second["scan"]["rescanned"] == len(second["scan"]["dirs"])
+
+
+def test_new_file_in_unchanged_parent_is_listed(tmp_path):
+    """Un archivo nuevo en un subdirectorio aparece aunque el padre no cambie."""
+    (tmp_path / "pkg" / "sub").mkdir(parents=True)
+    (tmp_path / "pkg" / "a.py").write_text("")
+
+    cli = AgentCLI(repo_root=str(tmp_path))
+    first = cli.generate_repo_context()
+
+    (tmp_path / "pkg" / "sub" / "new.py").write_text("")
+    _touch_later(tmp_path / "pkg" / "sub")
+    second = cli.generate_repo_context(first)
+
+    assert second["scan"]["rescanned"] == 1
+    assert sorted(second["metadata"]["python_files"]) == [
+        os.path.join("pkg", "a.py"), os.path.join("pkg", "sub", "new.py")
+    ]
+    assert second["structure"]["pkg"]["sub"]["_files"] == ["new.py"]
@@ -0,0 +1,390 @@
+"""Tests del parser de partidas (labs/parse_games_to_images.py)."""
+
+import shutil
+from io import StringIO
+from pathlib import Path
+
+import chess
+import chess.pgn
+import chess.svg
+import numpy as np
+import pytest
+
+from labs.parse_games_to_images import (
+    PALETTE_SIZE,
+    BoundedWriter,
+    ContentStore,
+    MoveCorpus,
+    build_move_corpus,
+    build_position_table,
+    codec_for_path,
+    count_player_moves,
+    extract_board_sequence,
+    extract_move_sequence,
+    iter_board_sequence,
+    iter_encoded_games,
+    iter_pgn_games,
+    make_codec,
+    move_heatmap_sequence,
+    overlay_temporal_sequence,
+    overlay_temporal_stream,
+    palette_lut,
+    process_pgn_file,
+    precheck_pgn_game,
+    resolve_player_color,
+    write_array,
+)
+
+TESTPGNS = Path(__file__).resolve().parents[1] / "dataset" / "testpgns"
+
+
+@pytest.fixture
+def cairosvg():
+    """Salta los tests de superposición si no se pueden renderizar tableros."""
+    try:
+        import cairosvg
+        cairosvg.svg2png(bytestring=chess.svg.board(size=8).encode("utf-8"))
+    except (ImportError, OSError):
+        pytest.skip("cairosvg/libcairo no disponible")
+    return cairosvg
+
+
+def _heatmaps(pgn_path, corpus=None):
+    """Salidas heatmap de un archivo, desde el PGN o desde un corpus."""
+    return [
+        (game_num, array.tobytes())
+        for game_num, _, array in iter_encoded_games(
+            pgn_path, 5, 14, 2, encoding="heatmap", corpus=corpus
+        )
+    ]
+
+
+def test_corpus_matches_pgn(tmp_path):
+    """Leer desde el corpus (con y sin tabla de posiciones) da lo mismo que el PGN."""
+    pgn_paths = sorted(TESTPGNS.glob("*.pgn"))[:3]
+    build_move_corpus(pgn_paths, tmp_path / "corpus")
+
+    with MoveCorpus(tmp_path / "corpus") as corpus:
+        assert corpus.positions is None
+        for pgn_path in pgn_paths:
+            assert _heatmaps(pgn_path, corpus) == _heatmaps(pgn_path)
+        build_position_table(corpus)
+
+    with MoveCorpus(tmp_path / "corpus") as corpus:
+        assert corpus.positions is not None
+        for pgn_path in pgn_paths:
+            assert _heatmaps(pgn_path, corpus) == _heatmaps(pgn_path)
+
+
+def test_rebuilt_corpus_drops_stale_positions(tmp_path):
+    """Regenerar el corpus en el mismo directorio no reutiliza la tabla anterior."""
+    corpus_dir = tmp_path / "corpus"
+    build_move_corpus(sorted(TESTPGNS.glob("*.pgn")), corpus_dir)
+    with MoveCorpus(corpus_dir) as corpus:
+        build_position_table(corpus)
+
+    single = tmp_path / "Izsak.pgn"
+    shutil.copy(TESTPGNS / "Izsak.pgn", single)
+    build_move_corpus([single], corpus_dir)
+
+    with MoveCorpus(corpus_dir) as corpus:
+        assert corpus.positions is None
+        assert _heatmaps(single, corpus) == _heatmaps(single)
+
+
+def test_stale_positions_table_is_ignored(tmp_path):
+    """Una tabla de otra generación del corpus se ignora aunque siga en disco."""
+    pgn_paths = sorted(TESTPGNS.glob("*.pgn"))[:2]
+    build_move_corpus(pgn_paths, tmp_path / "a")
+    build_move_corpus(pgn_paths, tmp_path / "b")
+    with MoveCorpus(tmp_path / "a") as corpus:
+        build_position_table(corpus)
+
+    shutil.copytree(tmp_path / "a" / "positions", tmp_path / "b" / "positions")
+
+    with MoveCorpus(tmp_path / "b") as corpus:
+        assert corpus.positions is None
+    with MoveCorpus(tmp_path / "a") as corpus:
+        assert corpus.positions is not None
+        assert len(corpus.positions) == int(np.asarray(corpus.positions.index)[-1, 1])
+
+
+def test_iter_pgn_games_skips_utf8_bom(tmp_path):
+    """Una BOM inicial no crea una partida falsa ni desplaza los offsets."""
+    data = (TESTPGNS / "Izsak.pgn").read_bytes()
+    bom_path = tmp_path / "Izsak.pgn"
+    bom_path.write_bytes(b"\xef\xbb\xbf" + data)
+
+    plain = list(iter_pgn_games(TESTPGNS / "Izsak.pgn"))
+    with_bom = list(iter_pgn_games(bom_path))
+
+    assert [text for _, text in with_bom] == [text for _, text in plain]
+    assert [offset for offset, _ in with_bom] == [3] + [offset + 3 for offset, _ in plain[1:]]
+    for offset, text in with_bom:
+        assert bom_path.read_bytes()[offset:offset + 1] == b"["
+    assert precheck_pgn_game("\ufeff" + plain[0][1], "Izsak", 5, True)[0] is None
+
+
+def test_codec_for_path_round_trips_webp(tmp_path):
+    """Las salidas WebP se leen con sus canales originales sin indicar el modo."""
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 256, (50, 50), dtype=np.uint8)
+    color = rng.integers(0, 256, (50, 50, 3), dtype=np.uint8)
+
+    for array in (gray, color):
+        path = tmp_path / f"out{array.ndim}.webp"
+        write_array(path, array, make_codec("webp", channels=1 if array.ndim == 2 else 3))
+        decoded = codec_for_path(path).read(path)
+        assert decoded.shape == array.shape
+        assert np.array_equal(decoded, array)
+
+
+def test_iter_pgn_games_ignores_braces_in_line_comments(tmp_path):
+    """Una ``{`` tras ``;`` no abre un comentario que se trague las partidas siguientes."""
+    pgn_path = tmp_path / "Foo.pgn"
+    pgn_path.write_text(
+        '[Event "a"]\n\n1. e4 e5 ; an idea {unbalanced\n2. Nf3 *\n\n'
+        '[Event "b"]\n\n1. d4 { a {nested? ; no } d5 *\n\n'
+        '[Event "c"]\n\n1. c4 *\n'
+    )
+
+    games = list(iter_pgn_games(pgn_path))
+
+    assert [text.splitlines()[0] for _, text in games] == [
+        '[Event "a"]', '[Event "b"]', '[Event "c"]'
+    ]
+
+
+def test_bounded_writer_survives_failing_on_error(tmp_path):
+    """Un ``on_error`` que lanza no deja a ``submit`` bloqueado para siempre."""
+    def write(path, array):
+        raise OSError("disco lleno")
+
+    def on_error(path, error, context):
+        raise KeyError(context)
+
+    array = np.zeros(100, dtype=np.uint8)
+    writer = BoundedWriter(max_pending_bytes=array.nbytes, on_error=on_error, write=write)
+    for i in range(5):
+        writer.submit(tmp_path / f"{i}.npy", array, context=i)
+    writer.close()
+
+    assert writer.failed == 5
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_bounded_writer_submit_raises_after_thread_death(tmp_path):
+    """Si el hilo escritor muere, ``submit`` lanza en lugar de esperar."""
+    def write(path, array):
+        raise SystemExit
+
+    array = np.zeros(100, dtype=np.uint8)
+    writer = BoundedWriter(max_pending_bytes=array.nbytes, write=write)
+    writer.submit(tmp_path / "a.npy", array)
+    writer._thread.join()
+
+    with pytest.raises(RuntimeError):
+        writer.submit(tmp_path / "b.npy", array)
+
+
+def test_heatmap_grid_by_default(tmp_path):
+    """El mapa de calor sale como rejilla 8x8 salvo que se pida escalarlo."""
+    pgn_path = TESTPGNS / "Izsak.pgn"
+    grids = list(iter_encoded_games(pgn_path, 5, 14, 2, encoding="heatmap"))
+    scaled = list(iter_encoded_games(pgn_path, 5, 14, 2, encoding="heatmap", heatmap_upsample=True))
+
+    assert grids and len(grids) == len(scaled)
+    for (_, _, grid), (_, _, image) in zip(grids, scaled):
+        assert grid.shape == (8, 8, 9)
+        assert image.shape == (200, 200, 9)
+        assert np.array_equal(image[::25, ::25], grid)
+
+
+def test_numpy_compression_factor(tmp_path):
+    """Un factor ``np.int64`` equivale al ``int``; una lista da ``{factor: array}``."""
+    pgn_path = TESTPGNS / "Izsak.pgn"
+    kwargs = dict(encoding="heatmap", heatmap_upsample=True)
+    plain = list(iter_encoded_games(pgn_path, 5, 14, 4, **kwargs))
+    numpy = list(iter_encoded_games(pgn_path, 5, 14, np.int64(4), **kwargs))
+    multi = list(iter_encoded_games(pgn_path, 5, 14, [np.int64(4)], **kwargs))
+
+    assert plain
+    for (_, _, a), (_, _, b), (_, _, c) in zip(plain, numpy, multi):
+        assert np.array_equal(a, b)
+        assert list(c) == [4] and np.array_equal(c[4], a)
+
+
+SHORT_PGN = '[White "Izsak, Gyula"]\n[Black "Lehmann, Heinz"]\n\n1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 *\n'
+
+
+def test_resolve_player_color():
+    """El color sale del apellido; la coincidencia exacta gana a la de prefijo."""
+    headers = {"White": "Izsak, Gyula", "Black": "Lehmann, Heinz"}
+    assert resolve_player_color(headers, "Izsak") == chess.WHITE
+    assert resolve_player_color(headers, "Lehmann") == chess.BLACK
+    assert resolve_player_color(headers, "Carlsen") is None
+    assert resolve_player_color({"White": "Magem Badals, Jordi", "Black": "X"}, "Magem") == chess.WHITE
+    assert resolve_player_color({"White": "Antunes, A", "Black": "Antunesl, B"}, "Antunesl") == chess.BLACK
+    assert resolve_player_color({"White": "Moroz, A", "Black": "Moroz, B"}, "Moroz") is None
+    assert resolve_player_color({}, "Moroz") is None
+
+
+def test_player_window_counts_player_moves():
+    """Con ``player_color`` la ventana cuenta solo las jugadas de ese color."""
+    game = chess.pgn.read_game(StringIO(SHORT_PGN))
+    assert count_player_moves(game) == 6
+    assert count_player_moves(game, chess.WHITE) == 3
+    assert count_player_moves(game, chess.BLACK) == 3
+
+    sq = chess.parse_square
+    white = extract_move_sequence(SHORT_PGN, 2, 3, chess.WHITE)
+    black = extract_move_sequence(SHORT_PGN, 2, 3, chess.BLACK)
+    assert white[:, :2].tolist() == [[sq("g1"), sq("f3")], [sq("f1"), sq("b5")]]
+    assert black[:, :2].tolist() == [[sq("b8"), sq("c6")], [sq("a7"), sq("a6")]]
+    assert extract_move_sequence(SHORT_PGN, 2, 3)[:, :2].tolist() == [
+        [sq("e7"), sq("e5")], [sq("g1"), sq("f3")]
+    ]
+
+    boards = extract_board_sequence(SHORT_PGN, 1, 3, chess.BLACK)
+    assert [board.ply() for board in boards] == [2, 4, 6]
+    with pytest.raises(ValueError):
+        extract_board_sequence(SHORT_PGN, 1, 4, chess.WHITE)
+
+
+def test_heatmap_channels_and_decay():
+    """Cada canal marca sus casillas con la rampa temporal y acumulación por máximo."""
+    moves = extract_move_sequence("1. e4 d5 2. exd5 Qxd5 *", 1, 4)
+    heatmap = move_heatmap_sequence(moves, upsample=False)
+    weights = np.round(np.linspace(0.3, 1.0, 4, dtype=np.float32) * 255).astype(np.uint8)
+    assert weights[0] < weights[1] < weights[2] < weights[3] == 255
+
+    def cell(name):
+        square = chess.parse_square(name)
+        return 7 - chess.square_rank(square), chess.square_file(square)
+
+    expected = np.zeros((8, 8, 9), dtype=np.uint8)
+    for name, weight in (("e2", 0), ("d7", 1), ("e4", 2), ("d8", 3)):
+        expected[cell(name) + (0,)] = weights[weight]
+    expected[cell("e4") + (1,)] = weights[0]
+    expected[cell("d5") + (1,)] = weights[3]
+    expected[cell("d5") + (2,)] = weights[3]
+    expected[cell("e4") + (3,)] = weights[0]
+    expected[cell("d5") + (3,)] = weights[2]
+    expected[cell("d5") + (7,)] = weights[3]
+
+    assert heatmap.shape == (8, 8, 9) and heatmap.dtype == np.uint8
+    assert np.array_equal(heatmap, expected)
+    assert np.array_equal(
+        move_heatmap_sequence(moves, min_intensity=1.0, upsample=False), (expected > 0) * np.uint8(255)
+    )
+
+
+def test_color_mode_output_shapes(cairosvg, tmp_path):
+    """gray y palette dan un canal; palette usa índices y guarda palette.npy."""
+    boards = extract_board_sequence(SHORT_PGN, 1, 4)
+
+    rgb = overlay_temporal_sequence(boards, 2)
+    gray = overlay_temporal_sequence(boards, 2, color_mode="gray")
+    palette = overlay_temporal_sequence(boards, 2, color_mode="palette")
+
+    assert rgb.shape == (200, 200, 3)
+    assert gray.shape == palette.shape == (200, 200)
+    assert gray.dtype == palette.dtype == np.uint8
+    assert palette.max() < PALETTE_SIZE
+    assert np.array_equal(palette, palette_lut()[0][gray])
+
+    pgn_path = tmp_path / "Izsak.pgn"
+    pgn_path.write_text(SHORT_PGN)
+    assert process_pgn_file(pgn_path, tmp_path / "out", 1, 4, 4, color_mode="palette") == 1
+    assert np.array_equal(np.load(tmp_path / "out" / "palette.npy"), palette_lut()[1])
+    written = codec_for_path(tmp_path / "out" / "Izsak_game01.png").read(tmp_path / "out" / "Izsak_game01.png")
+    assert written.shape == (100, 100)
+
+
+def test_streaming_overlay_matches_list_api(cairosvg):
+    """La superposición en streaming da lo mismo que la de la lista de tableros."""
+    game = chess.pgn.read_game(StringIO(SHORT_PGN))
+    for color_mode in ("rgb", "gray", "palette"):
+        expected = overlay_temporal_sequence(
+            extract_board_sequence(SHORT_PGN, 2, 5), 2, color_mode=color_mode, channel_order="bgr"
+        )
+        streamed = overlay_temporal_stream(
+            iter_board_sequence(game, 2, 5), 4, 2, color_mode=color_mode, channel_order="bgr"
+        )
+        assert np.array_equal(streamed, expected)
+
+    pgn_path = TESTPGNS / "Izsak.pgn"
+    text = next(iter(iter_pgn_games(pgn_path)))[1]
+    player_color = resolve_player_color(chess.pgn.read_game(StringIO(text)).headers, "Izsak")
+    expected = overlay_temporal_sequence(
+        extract_board_sequence(text, 5, 8, player_color), 2, channel_order="bgr"
+    )
+    _, _, encoded = next(iter_encoded_games(pgn_path, 5, 8, 2, player_moves_only=True))
+    assert np.array_equal(encoded, expected)
+
+
+def test_content_store_counts_duplicates_without_rewriting(tmp_path):
+    """Una salida repetida solo añade una entrada al índice, también al reabrir."""
+    a = np.arange(64, dtype=np.uint8).reshape(8, 8)
+    b = np.zeros((8, 8), dtype=np.uint8)
+
+    with ContentStore(tmp_path) as store:
+        store.write(tmp_path / "x_game01.npy", a)
+        store.write(tmp_path / "x_game02.npy", b)
+        store.write(tmp_path / "x_game03.npy", a.copy())
+    assert (store.entries, store.duplicates) == (3, 1)
+
+    objects = sorted((tmp_path / ContentStore.OBJECTS_DIR).rglob("*.npy"))
+    assert len(objects) == 2
+    inodes = {path: path.stat().st_ino for path in objects}
+
+    with ContentStore(tmp_path) as store:
+        store.write(tmp_path / "y_game01.npy", b)
+    assert (store.entries, store.duplicates) == (1, 1)
+    assert {path: path.stat().st_ino for path in objects} == inodes
+
+    index = ContentStore.read_index(tmp_path)
+    assert index["x_game01.npy"] == index["x_game03.npy"] != index["x_game02.npy"]
+    assert index["y_game01.npy"] == index["x_game02.npy"]
+    object_path = ContentStore.object_path(tmp_path, index["x_game03.npy"])
+    assert np.array_equal(np.load(object_path), a)
+
+
+def test_multi_resolution_matches_single_factor(cairosvg, tmp_path):
+    """x2 en una pasada multirresolución coincide con una pasada solo con factor 2."""
+    pgn_path = tmp_path / "Izsak.pgn"
+    pgn_path.write_text(SHORT_PGN)
+
+    assert process_pgn_file(pgn_path, tmp_path / "single", 1, 4, 2) == 1
+    assert process_pgn_file(pgn_path, tmp_path / "multi", 1, 4, [1, 2, 4]) == 1
+
+    def read(path):
+        return codec_for_path(path).read(path)
+
+    single = read(tmp_path / "single" / "Izsak_game01.png")
+    assert np.array_equal(read(tmp_path / "multi" / "x2" / "Izsak_game01.png"), single)
+    assert read(tmp_path / "multi" / "x1" / "Izsak_game01.png").shape == (400, 400, 3)
+
+    # x4 se reduce en cascada desde x2: difiere a lo sumo en 1 por redondeo
+    x4 = read(tmp_path / "multi" / "x4" / "Izsak_game01.png").astype(np.int16)
+    boards = extract_board_sequence(SHORT_PGN, 1, 4)
+    expected = overlay_temporal_sequence(boards, 4, channel_order="bgr").astype(np.int16)
+    assert x4.shape == expected.shape and np.abs(x4 - expected).max() <= 1
+
+
+def test_header_tags_accept_python_chess_names(tmp_path):
+    """Etiquetas como ``Time-Control`` abren partida y no marcan la cabecera como mal formada."""
+    pgn_path = tmp_path / "Izsak.pgn"
+    pgn_path.write_text(
+        '[Event "a"]\n[White "Izsak, G"]\n[Black "X"]\n\n1. e4 e5 2. Nf3 Nc6 *\n\n'
+        '[Time-Control "40/7200:3600"]\n[White "Izsak, G"]\n[Black "X"]\n[Setup#1 "0"]\n\n'
+        '1. d4 d5 2. c4 e6 *\n'
+    )
+
+    games = list(iter_pgn_games(pgn_path))
+
+    assert [text.splitlines()[0] for _, text in games] == [
+        '[Event "a"]', '[Time-Control "40/7200:3600"]'
+    ]
+    for _, text in games:
+        assert precheck_pgn_game(text, "Izsak", 2, True)[0] is None